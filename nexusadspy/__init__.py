@@ -5,6 +5,7 @@ from __future__ import (
     absolute_import, unicode_literals
 )
 
+from nexusadspy.scheduler import AppnexusScheduler  # NOQA
 from nexusadspy.client import AppnexusClient  # NOQA
 from nexusadspy.report import AppnexusReport  # NOQA
 from nexusadspy.segment import AppnexusSegmentsUploader  # NOQA
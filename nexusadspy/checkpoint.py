@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import (
+    print_function, division, generators,
+    absolute_import, unicode_literals
+)
+
+import io
+import json
+import os
+import threading
+
+_locks = {}
+_locks_lock = threading.Lock()
+
+
+class AppnexusCheckpoint:
+
+    def __init__(self, path):
+        """
+        Append-only journal on disk that lets long running API jobs resume after a failure.
+
+        Every line of the journal is a JSON object that carries the key of the job it belongs to.
+        Entries of a job are read back in the order they were recorded and removed once the job is done.
+        A journal file may be shared between threads, also through separate AppnexusCheckpoint instances.
+
+        :param path: str, Path to the journal file.
+        """
+        self.path = path
+        self._lock = _get_lock(path)
+
+    @staticmethod
+    def make_key(*parts):
+        """
+        Build a stable journal key from JSON serializable parts.
+
+        :param parts: Any JSON serializable values identifying a job, e.g. URL and request parameters.
+        :return: str, Journal key.
+        """
+        return json.dumps(parts, sort_keys=True)
+
+    def record(self, key, **entry):
+        """
+        Append an entry for job `key` to the journal.
+
+        :param key: str, Journal key as returned by `make_key`.
+        :param entry: Any JSON serializable values to be recorded.
+        """
+        entry['key'] = key
+        with self._lock, io.open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry, sort_keys=True, default=str) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+    def entries(self, key):
+        """
+        Return all entries recorded for job `key` in the order they were recorded.
+
+        :param key: str, Journal key as returned by `make_key`.
+        :return: list, List of entry dictionaries.
+        """
+        with self._lock:
+            return [entry for entry in self._read() if entry.get('key') == key]
+
+    def clear(self, key):
+        """
+        Remove all entries of job `key` from the journal.
+
+        :param key: str, Journal key as returned by `make_key`.
+        """
+        with self._lock:
+            remaining = [entry for entry in self._read() if entry.get('key') != key]
+
+            if not remaining:
+                if os.path.exists(self.path):
+                    os.remove(self.path)
+                return
+
+            tmp_path = self.path + '.tmp'
+            with io.open(tmp_path, 'w', encoding='utf-8') as f:
+                for entry in remaining:
+                    f.write(json.dumps(entry, sort_keys=True, default=str) + '\n')
+            _replace(tmp_path, self.path)
+
+    def _read(self):
+        if not os.path.exists(self.path):
+            return []
+
+        entries = []
+        with io.open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    break  # truncated last line of an interrupted write
+
+        return entries
+
+
+def _get_lock(path):
+    with _locks_lock:
+        return _locks.setdefault(os.path.abspath(path), threading.Lock())
+
+
+def _replace(src, dst):
+    try:
+        os.replace(src, dst)
+    except AttributeError:  # Python 2
+        if os.path.exists(dst):
+            os.remove(dst)
+        os.rename(src, dst)
@@ -5,7 +5,9 @@ from __future__ import (
     absolute_import, unicode_literals
 )
 
-from collections import defaultdict
+from contextlib import contextmanager
+from gzip import GzipFile
+from io import BytesIO
 import os
 import time
 import json
@@ -21,17 +23,29 @@ try:
 except ImportError as err:
     FileNotFoundError = IOError
 
+try:
+    import ijson
+    from ijson.common import ObjectBuilder
+except ImportError:
+    ijson = None
+
+from nexusadspy.checkpoint import AppnexusCheckpoint
 from nexusadspy.exceptions import NexusadspyAPIError, NexusadspyConfigurationError
+from nexusadspy.rows import AppnexusRows
 
 import requests
 
 
 logging.basicConfig(level=logging.INFO)
 
+COMPRESS_MIN_BYTES = 1024
+
 
 class AppnexusClient:
 
-    def __init__(self, path, endpoint='https://api.appnexus.com', mode='production', username=None, password=None):
+    def __init__(self, path, endpoint='https://api.appnexus.com', mode='production', username=None, password=None,
+                 checkpoint_path=None, checkpoint_ttl_seconds=3600, scheduler=None, priority=None, compact_rows=False,
+                 compress_requests=False):
         """
         Client object that interacts with the AppNexus API.
 
@@ -40,12 +54,29 @@ class AppnexusClient:
         :param mode: str, Client mode either 'production' or 'development'.
         :param username: str, Username for API access.
         :param password: str, Password for API access.
+        :param checkpoint_path: str (optional), Path to a checkpoint journal. If given, pages fetched by paged GET
+            requests are journaled and an interrupted request resumes after the last page fetched.
+        :param checkpoint_ttl_seconds: int (optional), Seconds after which journaled pages are discarded
+            and the request starts over instead of resuming. Defaults to one hour.
+        :param scheduler: AppnexusScheduler (optional), Scheduler sharing one rate budget between clients.
+        :param priority: str (optional), Priority of this client's requests on `scheduler`.
+            Defaults to the scheduler's lowest priority.
+        :param compact_rows: bool (optional), Return paged GET results and CSV reports as AppnexusRows
+            instead of lists of dictionaries. Defaults to False.
+        :param compress_requests: bool (optional), Send JSON bodies of POST, PUT, and DELETE requests
+            gzip-compressed if they are larger than 1 KB.
         """
         self.path = path
         self.endpoint = endpoint
         self.mode = mode
         self.username = username
         self.password = password
+        self.checkpoint = AppnexusCheckpoint(checkpoint_path) if checkpoint_path else None
+        self.checkpoint_ttl_seconds = checkpoint_ttl_seconds
+        self.scheduler = scheduler
+        self.priority = priority
+        self.compact_rows = compact_rows
+        self.compress_requests = compress_requests
         self._session = None
         self.logger = logging.getLogger('AppnexusClient')
         self.request_args = None
@@ -61,7 +92,7 @@ class AppnexusClient:
         :param params: dict (optional), Any data to be sent in URL as parameters.
         :param data: dict (optional), Any data to be sent in the request.
         :param headers: dict (optional), Any HTTP headers to be sent in the request.
-        :return: list, List of response dictionaries.
+        :return: list, List of response dictionaries, or AppnexusRows for reports and compact results.
         """
         self.request_args = args
         self.request_kwargs = kwargs
@@ -99,11 +130,98 @@ class AppnexusClient:
 
         self._check_response(res_code, res)
 
-        if not isinstance(res, list):
+        if not isinstance(res, (list, AppnexusRows)):
             res = [res]
 
         return res
 
+    def iter_request(self, service, get_field=None, params=None, data=None, headers=None, batch_size=100,
+                     *args, **kwargs):
+        """
+        Sends a paged GET request to the Appnexus API and yields the returned objects one by one.
+
+        Only one page is held in memory at a time. If `get_field` is given and the optional package `ijson`
+        is installed, every page is decoded incrementally and objects are yielded as the response arrives.
+
+        :param service: str, One of the services Appnexus services (https://wiki.appnexus.com/display/api/API+Services).
+        :param get_field: str (optional), Response field holding the objects, e.g. 'advertisers'.
+        :param params: dict (optional), Any data to be sent in URL as parameters.
+        :param data: dict (optional), Any data to be sent in the request.
+        :param headers: dict (optional), Any HTTP headers to be sent in the request.
+        :param batch_size: int (optional), Number of objects per page. Defaults to 100.
+        :return: generator, Response dictionaries.
+        """
+        self.request_args = args
+        self.request_kwargs = kwargs
+
+        url = urljoin(base=self.endpoint, url=service)
+        data = dict(data or {})
+        start_element = 0
+
+        while True:
+            data.update({'start_element': start_element,
+                         'batch_size': batch_size})
+
+            page = {'count': None, 'items': 0}
+            for item in self._iter_page(url, params, data, headers, get_field, page):
+                page['items'] += 1
+                yield item
+
+            start_element += batch_size
+            if page['count'] is not None and start_element >= page['count']:
+                break
+            if page['count'] is None and page['items'] < batch_size:
+                break
+
+    def _iter_page(self, url, params, data, headers, get_field, page):
+        if ijson is not None and get_field is not None:
+            headers = dict(headers or {})
+            headers['Authorization'] = self._get_auth_token()
+
+            with self._request_slot():
+                r = self.session.request('get', url, params=params, data=json.dumps(data), headers=headers,
+                                         stream=True, *self.request_args, **self.request_kwargs)
+            try:
+                if r.status_code == 200:
+                    r.raw.decode_content = True
+                    page['error'] = False
+                    for item in self._iter_streamed_page(r.raw, get_field, page):
+                        yield item
+                    if not page['error']:
+                        return
+            finally:
+                r.close()
+
+        # errors and responses that cannot be streamed go through throttling and authentication handling
+        r_code, r = self._do_authenticated_request(url, 'get', params=params, data=data, headers=headers,
+                                                   get_field=get_field)
+        self._check_response(r_code, r)
+
+        page['count'] = int(r.get('count', 0) or 0)
+        for item in self._get_page_output(r, get_field or r['dbg_info']['output_term']):
+            yield item
+
+    @staticmethod
+    def _iter_streamed_page(raw, get_field, page):
+        item_prefix = 'response.{}.item'.format(get_field)
+        events = ijson.parse(raw, use_float=True)
+
+        for prefix, event, value in events:
+            if prefix == 'response.count':
+                page['count'] = int(value or 0)
+            elif prefix in ('response.error_id', 'response.error_code') and value:
+                page['error'] = True
+            elif prefix == item_prefix and event in ('start_map', 'start_array'):
+                builder = ObjectBuilder()
+                builder.event(event, value)
+                for prefix, event, value in events:
+                    builder.event(event, value)
+                    if prefix == item_prefix and event in ('end_map', 'end_array'):
+                        break
+                yield builder.value
+            elif prefix == item_prefix:
+                yield value
+
     def _get_non_production_response(self):
         return {
             'response': {
@@ -128,13 +246,19 @@ class AppnexusClient:
     def _do_paged_get(self, url, method, params=None, data=None, headers=None,
                       start_element=None, batch_size=None, max_items=None,
                       get_field=None):
-        res = defaultdict(list)
+        res = {}
+        data = dict(data or {})  # keep paging parameters out of the caller's data and the checkpoint key
 
         if start_element is None:
             start_element = 0
         if batch_size is None:
             batch_size = 100
 
+        checkpoint_key = None
+        if self.checkpoint is not None:
+            checkpoint_key = self.checkpoint.make_key(self.path, self.endpoint, url, method, params, data, get_field)
+            start_element, batch_size = self._resume_paged_get(checkpoint_key, res, start_element, batch_size)
+
         while True:
             data.update({'start_element': start_element,
                          'batch_size': batch_size})
@@ -143,16 +267,17 @@ class AppnexusClient:
                                                        data=data, headers=headers,
                                                        get_field=get_field)
 
+            self._check_response(r_code, r)
+
             output_term = get_field or r['dbg_info']['output_term']
-            output = r.get(output_term, r)
+            output = self._get_page_output(r, output_term)
+            if self.compact_rows and not isinstance(output, AppnexusRows):
+                output = AppnexusRows.from_dicts(output)
 
-            if isinstance(output, list):
-                res[output_term] += output  # assume list of dictionaries
-            else:
-                if not isinstance(output, dict):
-                    res[output_term].append({output_term: output})
-                else:
-                    res[output_term].append(output)
+            if checkpoint_key is not None:
+                self._checkpoint_page(checkpoint_key, start_element, batch_size, output_term, output)
+
+            self._add_page_output(res, output_term, output)
 
             start_element += batch_size
 
@@ -165,18 +290,70 @@ class AppnexusClient:
 
         res = res[output_term]
 
+        if checkpoint_key is not None:
+            self.checkpoint.clear(checkpoint_key)
+
         return r_code, res
 
+    def _resume_paged_get(self, checkpoint_key, res, start_element, batch_size):
+        entries = self.checkpoint.entries(checkpoint_key)
+        if entries and time.time() - entries[0].get('recorded_at', 0) > self.checkpoint_ttl_seconds:
+            self.checkpoint.clear(checkpoint_key)  # do not stitch stale pages onto fresh ones
+            return start_element, batch_size
+
+        for entry in entries:
+            if 'header' in entry:
+                output = AppnexusRows(entry['header'], entry['rows'])
+            else:
+                output = entry['output']
+            self._add_page_output(res, entry['output_term'], output)
+            start_element = entry['start_element'] + entry['batch_size']
+            batch_size = entry['batch_size']
+
+        return start_element, batch_size
+
+    def _checkpoint_page(self, checkpoint_key, start_element, batch_size, output_term, output):
+        if isinstance(output, AppnexusRows):
+            self.checkpoint.record(checkpoint_key, start_element=start_element, batch_size=batch_size,
+                                   output_term=output_term, header=output.header, rows=output._rows,
+                                   recorded_at=time.time())
+        else:
+            self.checkpoint.record(checkpoint_key, start_element=start_element, batch_size=batch_size,
+                                   output_term=output_term, output=output, recorded_at=time.time())
+
+    @staticmethod
+    def _add_page_output(res, output_term, output):
+        if output_term not in res:
+            res[output_term] = output
+        else:
+            res[output_term].extend(output)
+
+    @staticmethod
+    def _get_page_output(r, output_term):
+        output = r.get(output_term, r)
+
+        if isinstance(output, (list, AppnexusRows)):
+            return output  # assume list of dictionaries
+        elif isinstance(output, dict):
+            return [output]
+        else:
+            return [{output_term: output}]
+
     def _do_throttled_request(self, url, method, params=None, data=None, headers=None,
                               sec_sleep=2., max_failures=100,
                               get_field=None):
 
         if isinstance(data, dict):
             data = json.dumps(data)
+            if self.compress_requests and method.lower() != 'get' and len(data) >= COMPRESS_MIN_BYTES:
+                data = self._compress(data)
+                headers = dict(headers or {})
+                headers['Content-Encoding'] = 'gzip'
         no_fail = 0
         while True:
-            r = self.session.request(method, url, params=params, data=data, headers=headers,
-                                     *self.request_args, **self.request_kwargs)
+            with self._request_slot():
+                r = self.session.request(method, url, params=params, data=data, headers=headers,
+                                         *self.request_args, **self.request_kwargs)
             r_code = r.status_code
 
             headers = r.headers
@@ -185,13 +362,15 @@ class AppnexusClient:
                 r = r.json()['response']
             except (KeyError, ValueError):
                 if len(r.content) > 0:
-                    r = self._convert_csv_to_dict(r.content, get_field)
+                    r = self._convert_csv_to_dict(r.content, get_field, compact=self.compact_rows)
                 else:
                     self._check_response(r_code, {})
                     r = {}
 
             if no_fail < max_failures and r.get('error_code', '') == 'RATE_EXCEEDED':
                 no_fail += 1
+                if self.scheduler is not None:
+                    self.scheduler.penalize()
                 time.sleep(sec_sleep ** no_fail)
                 continue
 
@@ -200,17 +379,35 @@ class AppnexusClient:
             return r_code, r
 
     @staticmethod
-    def _convert_csv_to_dict(csv_bytestr, field):
+    def _compress(data):
+        compressed_buffer = BytesIO()
+        with GzipFile(fileobj=compressed_buffer, mode='wb') as compressor:
+            compressor.write(data.encode('UTF-8'))
+        return compressed_buffer.getvalue()
+
+    @contextmanager
+    def _request_slot(self):
+        if self.scheduler is None:
+            yield
+        else:
+            with self.scheduler.slot(self.priority):
+                yield
+
+    @staticmethod
+    def _convert_csv_to_dict(csv_bytestr, field, compact=False):
         s = csv_bytestr.decode('latin-1')
         headings, rows = s.split('\r\n')[0], s.split('\r\n')[1:]
         headings = [h.strip() for h in headings.split(',')]
         rows = (r for r in rows if len(r) > 0)
         rows = (r.split(',') for r in rows)
-        rows = [[el.strip() for el in r] for r in rows]
 
-        res = [{h: v for h, v in zip(headings, row)} for row in rows]
+        values = {}  # share repeated values such as dates and IDs between rows
+        rows = [tuple(values.setdefault(el.strip(), el.strip()) for el in r) for r in rows]
+
+        if compact:
+            return {field: AppnexusRows(headings, rows)}
 
-        return {field: res}
+        return {field: [{h: v for h, v in zip(headings, row)} for row in rows]}
 
     def _do_authenticated_request(self, url, method, params=None, data=None,
                                   headers=None, get_field=None):
@@ -277,7 +474,9 @@ class AppnexusClient:
                 )
 
     def _check_response(self, response_code, response):
-        if not isinstance(response, list):
+        if isinstance(response, AppnexusRows) and 'error_id' not in response.header:
+            response = [{}]  # rows without error column, only the status code needs checking
+        elif not isinstance(response, (list, AppnexusRows)):
             response = [response]
 
         for res in response:
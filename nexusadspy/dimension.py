@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import (
+    print_function, division, generators,
+    absolute_import, unicode_literals
+)
+
+import io
+import json
+import logging
+import time
+
+from nexusadspy.client import AppnexusClient
+from nexusadspy.checkpoint import _replace
+from nexusadspy.rows import AppnexusRows
+
+
+class AppnexusDimensionTable:
+
+    def __init__(self, service, fields=None, key='id', params=None, path=None, ttl_seconds=86400,
+                 credentials_path='.appnexus_auth.json', client=None, batch_size=100):
+        """
+        Local, indexed table of AppNexus objects used to enrich report rows without per-row API calls.
+
+        The table is loaded lazily on first use with one paged request for all objects of `service`
+        and refreshed in bulk once it is older than `ttl_seconds`.
+        Keys missing from the table are requested together in batches of `batch_size`.
+
+        :param service: str, AppNexus service of the objects, e.g. 'line-item' or 'advertiser'.
+        :param fields: list (optional), Object fields to be kept in memory. Defaults to all fields.
+        :param key: str (optional), Object field the table is indexed by. Defaults to 'id'.
+        :param params: dict (optional), URL parameters for the bulk request, e.g. {'advertiser_id': 123}.
+        :param path: str (optional), Path to a JSON file the table is cached in between processes.
+        :param ttl_seconds: int (optional), Seconds after which the table is refreshed. Defaults to one day.
+        :param credentials_path: str (optional), Credentials path for AppnexusClient.
+        :param client: AppnexusClient (optional), Client used to load the table.
+        :param batch_size: int (optional), Number of missing keys requested at once. Defaults to 100.
+        """
+        self.service = service
+        self.fields = fields
+        self.key = key
+        self.params = params or {}
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.credentials_path = credentials_path
+        self.batch_size = batch_size
+        self._client = client
+        self._index = None
+        self._loaded_at = None
+        self._absent = set()
+        self._logger = logging.getLogger('nexusadspy.dimension')
+
+    @property
+    def client(self):
+        self._client = self._client or AppnexusClient(self.credentials_path)
+        return self._client
+
+    def lookup(self, key):
+        """
+        Return the object indexed by `key` or None.
+
+        :param key: Object key, e.g. the ID as found in a report column.
+        :return: dict, The object or None.
+        """
+        return self._get_index().get(str(key))
+
+    def join(self, rows, on, fields):
+        """
+        Hash join `rows` with the table and add the joined object fields to every row.
+
+        :param rows: list, List of row dictionaries or AppnexusRows, e.g. as returned by `AppnexusReport.get`.
+        :param on: str, Row column holding the object key.
+        :param fields: dict, Mapping of new row column to object field. Nested fields are separated by dots,
+            e.g. {'advertiser_name': 'name', 'advertiser_parent': 'advertiser.id'}.
+        :return: list, The enriched rows. Columns of rows without a matching object are set to None.
+        """
+        keys = set(str(row[on]) for row in rows if row.get(on) not in (None, ''))
+        self._fetch_missing(keys)
+        index = self._get_index()
+
+        objs = [index.get(str(row.get(on))) for row in rows]
+
+        if isinstance(rows, AppnexusRows):
+            for column, field in fields.items():
+                rows.add_column(column, [self._get_field(obj, field) if obj is not None else None for obj in objs])
+            return rows
+
+        for row, obj in zip(rows, objs):
+            for column, field in fields.items():
+                row[column] = self._get_field(obj, field) if obj is not None else None
+
+        return rows
+
+    def refresh(self):
+        """
+        Reload all objects of `service` with one paged request.
+        """
+        objects = self.client.request(self.service, 'GET', params=dict(self.params))
+        self._index = {}
+        self._absent = set()
+        self._add(objects)
+        self._loaded_at = time.time()
+        self._write_cache()
+
+    def _get_index(self):
+        if self._index is None:
+            self._read_cache()
+        if self._index is None or time.time() - self._loaded_at >= self.ttl_seconds:
+            self.refresh()
+
+        return self._index
+
+    def _fetch_missing(self, keys):
+        index = self._get_index()
+        missing = sorted(k for k in keys if k not in index and k not in self._absent)
+        if not missing or self.key != 'id':
+            return
+
+        self._logger.info('Requesting {} objects missing from "{}".'.format(len(missing), self.service))
+        for i in range(0, len(missing), self.batch_size):
+            params = dict(self.params, id=','.join(missing[i:i + self.batch_size]))
+            self._add(self.client.request(self.service, 'GET', params=params))
+
+        self._absent.update(k for k in missing if k not in index)  # do not request unknown keys again
+        self._write_cache()
+
+    def _add(self, objects):
+        for obj in objects:
+            if self.key not in obj:
+                continue
+            if self.fields is not None:
+                obj = {f: obj.get(f) for f in set(self.fields) | {self.key}}
+            self._index[str(obj[self.key])] = obj
+
+    @staticmethod
+    def _get_field(obj, field):
+        for part in field.split('.'):
+            if not isinstance(obj, dict):
+                return None
+            obj = obj.get(part)
+
+        return obj
+
+    def _read_cache(self):
+        if self.path is None:
+            return
+
+        try:
+            with io.open(self.path, 'r', encoding='utf-8') as f:
+                cache = json.load(f)
+        except (IOError, OSError, ValueError):
+            return
+
+        self._index = cache['index']
+        self._loaded_at = cache['loaded_at']
+
+    def _write_cache(self):
+        if self.path is None:
+            return
+
+        tmp_path = self.path + '.tmp'
+        with io.open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(json.dumps({'index': self._index, 'loaded_at': self._loaded_at}))
+        _replace(tmp_path, self.path)
@@ -0,0 +1,224 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import (
+    print_function, division, generators,
+    absolute_import, unicode_literals
+)
+
+from datetime import datetime, timedelta
+import csv
+import io
+import json
+import logging
+import os
+import sys
+
+try:
+    from zoneinfo import ZoneInfo
+except ImportError:
+    try:
+        from pytz import timezone as ZoneInfo
+    except ImportError:
+        ZoneInfo = None
+
+from nexusadspy.checkpoint import _replace
+from nexusadspy.exceptions import NexusadspyConfigurationError
+from nexusadspy.report import AppnexusReport
+
+HOUR_FORMAT = '%Y-%m-%d %H'
+
+
+class AppnexusReportMaterializer:
+
+    def __init__(self, root, columns, report_type='network_analytics', finalization_hours=24,
+                 credentials_path='.appnexus_auth.json', **report_kwargs):
+        """
+        Local store of an hourly report that only requests hours not yet materialized or not yet final.
+
+        Every hour is stored as a CSV partition `<root>/<YYYY-MM-DD>/<HH>.csv`.
+        A manifest in `root` records which partitions exist and which of them are final.
+        Partitions are replaced atomically so that readers never see partially written data.
+
+        :param root: str, Directory of the store.
+        :param columns: list, Report columns. The column 'hour' is added if missing.
+        :param report_type: str (optional), Hourly AppNexus report type. Defaults to 'network_analytics'.
+        :param finalization_hours: int (optional), Hours after the end of an hour until its data is considered final.
+            Non-final partitions are requested again on every `materialize`. Defaults to 24.
+        :param credentials_path: str (optional), Credentials path for AppnexusClient.
+        :param report_kwargs: Further keyword arguments for AppnexusReport, e.g. filters or timezone.
+            Hours are stored and checked for finality in the report timezone, 'CET' unless given.
+        """
+        self.root = root
+        self.columns = columns if 'hour' in columns else ['hour'] + list(columns)
+        self.report_type = report_type
+        self.finalization_hours = finalization_hours
+        self.credentials_path = credentials_path
+        self.report_kwargs = report_kwargs
+        self._logger = logging.getLogger('nexusadspy.materializer')
+
+    @property
+    def definition(self):
+        return {'report_type': self.report_type, 'columns': self.columns, 'report_kwargs': self.report_kwargs}
+
+    def materialize(self, start_date, end_date, client=None):
+        """
+        Request all hours between `start_date` and `end_date` that are missing or not final and store them.
+
+        :param start_date: str, First hour to be materialized, as YYYY-MM-DD or YYYY-MM-DD HH:MM:SS.
+        :param end_date: str, End of the hours to be materialized (exclusive), same format as `start_date`.
+        :param client: AppnexusClient (optional), Client used to run the reports.
+        :return: list, Hours (as YYYY-MM-DD HH) that were requested.
+        """
+        manifest = self._read_manifest()
+        hours = self._get_hours(start_date, end_date)
+        pending = [h for h in hours if not manifest['partitions'].get(h.strftime(HOUR_FORMAT), {}).get('final')]
+
+        for range_start, range_end in self._get_ranges(pending):
+            self._logger.info('Materializing "{}" from "{}" to "{}".'.format(self.report_type, range_start, range_end))
+            report = AppnexusReport(self.report_type, list(self.columns),
+                                    start_date=range_start.strftime('%Y-%m-%d %H:%M:%S'),
+                                    end_date=range_end.strftime('%Y-%m-%d %H:%M:%S'),
+                                    credentials_path=self.credentials_path, **self.report_kwargs)
+            rows = report.get(client=client)
+
+            partitions = {h: [] for h in self._get_hours(range_start, range_end)}
+            for row in rows:
+                hour = datetime.strptime(row['hour'][:13], HOUR_FORMAT)
+                if hour in partitions:
+                    partitions[hour].append(row)
+                else:
+                    self._logger.warning('Skipping row of hour "{}" outside of the requested range.'.format(hour))
+
+            for hour, partition_rows in sorted(partitions.items()):
+                self._write_partition(hour, partition_rows)
+                manifest['partitions'][hour.strftime(HOUR_FORMAT)] = {'final': self._is_final(hour),
+                                                                      'rows': len(partition_rows)}
+            self._write_manifest(manifest)
+
+        return [h.strftime(HOUR_FORMAT) for h in pending]
+
+    def read(self, start_date, end_date, format_='json'):
+        """
+        Read the materialized hours between `start_date` and `end_date` without calling the API.
+
+        :param start_date: str, First hour to be read, as YYYY-MM-DD or YYYY-MM-DD HH:MM:SS.
+        :param end_date: str, End of the hours to be read (exclusive), same format as `start_date`.
+        :param format_: optional, Specify 'pandas' to get a DataFrame. Partitions are row-oriented CSV files
+            and are parsed into memory, they are not memory-mapped.
+        :return: list, List of row dictionaries, or a DataFrame.
+        """
+        manifest = self._read_manifest()
+        hours = self._get_hours(start_date, end_date)
+
+        missing = [h.strftime(HOUR_FORMAT) for h in hours if h.strftime(HOUR_FORMAT) not in manifest['partitions']]
+        if missing:
+            raise ValueError('Hours "{}" are not materialized. Run "materialize" first.'.format(missing))
+
+        paths = [self._get_partition_path(h) for h in hours]
+
+        if format_ == 'pandas':
+            import pandas as pd
+
+            frames = [pd.read_csv(path, dtype=str, keep_default_na=False) for path in paths]
+            return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=self.columns)
+
+        rows = []
+        for path in paths:
+            with _open_csv(path, 'r') as f:
+                rows += list(csv.DictReader(f))
+
+        return rows
+
+    def _is_final(self, hour):
+        return hour + timedelta(hours=1 + self.finalization_hours) <= self._now()
+
+    def _now(self):
+        if ZoneInfo is None:
+            raise NexusadspyConfigurationError('Materializing reports requires the package "pytz" '
+                                               'on Python versions without "zoneinfo".')
+
+        timezone = ZoneInfo(self.report_kwargs.get('timezone', 'CET'))
+        now = timezone.fromutc(self._utcnow().replace(tzinfo=timezone))
+
+        return now.replace(tzinfo=None)
+
+    @staticmethod
+    def _utcnow():
+        return datetime.utcnow()
+
+    @staticmethod
+    def _parse_date(date):
+        if isinstance(date, datetime):
+            return date
+
+        return datetime.strptime(AppnexusReport._format_date(date), '%Y-%m-%d %H:%M:%S')
+
+    def _get_hours(self, start_date, end_date):
+        start = self._parse_date(start_date).replace(minute=0, second=0, microsecond=0)
+        end = self._parse_date(end_date)
+
+        hours = []
+        while start < end:
+            hours.append(start)
+            start += timedelta(hours=1)
+
+        return hours
+
+    @staticmethod
+    def _get_ranges(hours):
+        ranges = []
+        for hour in hours:
+            if ranges and ranges[-1][1] == hour:
+                ranges[-1][1] = hour + timedelta(hours=1)
+            else:
+                ranges.append([hour, hour + timedelta(hours=1)])
+
+        return [tuple(r) for r in ranges]
+
+    def _get_partition_path(self, hour):
+        return os.path.join(self.root, hour.strftime('%Y-%m-%d'), hour.strftime('%H') + '.csv')
+
+    def _write_partition(self, hour, rows):
+        path = self._get_partition_path(hour)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+
+        tmp_path = path + '.tmp'
+        with _open_csv(tmp_path, 'w') as f:
+            writer = csv.writer(f)
+            writer.writerow(self.columns)
+            for row in rows:
+                writer.writerow([row.get(c, '') for c in self.columns])
+        _replace(tmp_path, path)
+
+    def _get_manifest_path(self):
+        return os.path.join(self.root, 'manifest.json')
+
+    def _read_manifest(self):
+        try:
+            with io.open(self._get_manifest_path(), 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+        except (IOError, OSError):
+            return {'definition': self.definition, 'partitions': {}}
+
+        if manifest['definition'] != self.definition:
+            raise ValueError('Store "{}" holds report "{}", not "{}".'.format(
+                self.root, manifest['definition'], self.definition))
+
+        return manifest
+
+    def _write_manifest(self, manifest):
+        if not os.path.isdir(self.root):
+            os.makedirs(self.root)
+
+        tmp_path = self._get_manifest_path() + '.tmp'
+        with io.open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(json.dumps(manifest, sort_keys=True))
+        _replace(tmp_path, self._get_manifest_path())
+
+
+def _open_csv(path, mode):
+    if sys.version_info[0] < 3:
+        return open(path, mode + 'b')
+
+    return io.open(path, mode, newline='', encoding='utf-8')
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import (
+    print_function, division, generators,
+    absolute_import, unicode_literals
+)
+
+import io
+import json
+import time
+
+from nexusadspy.client import AppnexusClient
+from nexusadspy.checkpoint import _replace
+
+
+class AppnexusReportMetadata:
+
+    def __init__(self, path, credentials_path='.appnexus_auth.json', ttl_seconds=86400):
+        """
+        Local cache of AppNexus report metadata (available columns, filters, time granularity).
+
+        Metadata of a report type is fetched once through the report service's `meta` call
+        and reused until it is older than `ttl_seconds`.
+
+        :param path: str, Path to the JSON file the metadata is cached in.
+        :param credentials_path: str (optional), Credentials path for AppnexusClient.
+        :param ttl_seconds: int (optional), Seconds after which cached metadata is fetched again. Defaults to one day.
+        """
+        self.path = path
+        self.credentials_path = credentials_path
+        self.ttl_seconds = ttl_seconds
+
+    def get(self, report_type, client=None):
+        """
+        Return the metadata of `report_type`, fetching it from the API if the cache is missing or expired.
+
+        :param report_type: str, AppNexus report type, e.g. 'network_analytics'.
+        :param client: AppnexusClient (optional), Client used on cache misses.
+        :return: dict, Report metadata as returned by the API.
+        """
+        cache = self._read()
+        cached = cache.get(report_type)
+
+        if cached is not None and time.time() - cached['timestamp'] < self.ttl_seconds:
+            return cached['meta']
+
+        client = client or AppnexusClient(self.credentials_path)
+        meta = client.request('report', 'GET', params={'meta': report_type}, get_field='meta')[0]
+
+        cache[report_type] = {'timestamp': time.time(), 'meta': meta}
+        self._write(cache)
+
+        return meta
+
+    def validate(self, report_type, columns, filters=None, groups=None, report_interval=None, client=None):
+        """
+        Check a report request against the metadata of `report_type`.
+
+        Parts of the request are only checked if the metadata lists the corresponding options.
+
+        :param report_type: str, AppNexus report type.
+        :param columns: list, Requested columns.
+        :param filters: list (optional), Requested filters, either column names or dictionaries keyed by column.
+        :param groups: list (optional), Requested groups.
+        :param report_interval: str (optional), Requested report interval.
+        :param client: AppnexusClient (optional), Client used on cache misses.
+        :raises ValueError: If any column, filter, group, or the interval is not available for `report_type`.
+        """
+        meta = self.get(report_type, client=client)
+
+        errors = []
+        if 'columns' in meta:
+            available_columns = self._get_names(meta['columns'])
+            errors += self._get_errors('columns', columns, available_columns)
+            errors += self._get_errors('groups', groups or [], available_columns)
+        if 'filters' in meta:
+            errors += self._get_errors('filters', self._get_filter_names(filters or []),
+                                       self._get_names(meta['filters']))
+        if 'time_intervals' in meta and report_interval is not None:
+            errors += self._get_errors('report_interval', [report_interval], set(meta['time_intervals']))
+
+        if errors:
+            raise ValueError('Invalid report request for report type "{}": {}.'.format(report_type,
+                                                                                       '; '.join(errors)))
+
+    @staticmethod
+    def _get_names(items):
+        return set(item['column'] if isinstance(item, dict) else item for item in items)
+
+    @staticmethod
+    def _get_filter_names(filters):
+        names = []
+        for f in filters:
+            if isinstance(f, dict):
+                names += list(f.keys())
+            else:
+                names.append(f)
+
+        return names
+
+    @staticmethod
+    def _get_errors(field, requested, available):
+        invalid = [item for item in requested if item not in available]
+        if not invalid:
+            return []
+
+        return ['{} not available: "{}"'.format(field, '", "'.join(invalid))]
+
+    def _read(self):
+        try:
+            with io.open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (IOError, OSError, ValueError):
+            return {}
+
+    def _write(self, cache):
+        tmp_path = self.path + '.tmp'
+        with io.open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(json.dumps(cache, sort_keys=True))
+        _replace(tmp_path, self.path)
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import (
+    print_function, division, generators,
+    absolute_import, unicode_literals
+)
+
+from multiprocessing.pool import ThreadPool
+import logging
+
+from nexusadspy.client import AppnexusClient
+from nexusadspy.scheduler import AppnexusScheduler
+
+
+class AppnexusClientPool:
+
+    def __init__(self, members, max_workers=None, scheduler_kwargs=None, **client_kwargs):
+        """
+        Pool of per-member clients that runs the same request or report across many AppNexus members concurrently.
+
+        Every member has its own client and hence its own token cache and session.
+
+        :param members: dict, Mapping of member ID to either the member's credentials path,
+            a dictionary of AppnexusClient keyword arguments, or an AppnexusClient.
+        :param max_workers: int (optional), Maximum number of members served concurrently.
+            Defaults to the number of members.
+        :param scheduler_kwargs: dict (optional), Keyword arguments for an AppnexusScheduler created for each member
+            whose client is built by the pool. Use this to apply the rate limits of each member separately.
+        :param client_kwargs: Keyword arguments passed to every AppnexusClient built by the pool.
+        """
+        if not members:
+            raise ValueError('Argument "members" must name at least one member. You supplied: "{}".'.format(members))
+
+        self.clients = {
+            member: self._build_client(client, scheduler_kwargs, client_kwargs)
+            for member, client in members.items()
+        }
+        self.max_workers = max_workers or len(self.clients)
+        self._logger = logging.getLogger('nexusadspy.pool')
+
+    def request(self, service, method, params=None, data=None, headers=None, get_field=None,
+                return_exceptions=False):
+        """
+        Send the same request on behalf of every member.
+
+        :param service: str, AppNexus service.
+        :param method: str, HTTP method to be used.
+        :param params: dict (optional), Any data to be sent in URL as parameters.
+        :param data: dict (optional), Any data to be sent in the request.
+        :param headers: dict (optional), Any HTTP headers to be sent in the request.
+        :param get_field: str (optional), Field of the response to be returned.
+        :param return_exceptions: bool (optional), Return exceptions raised for a member as its result
+            instead of raising the first of them. Defaults to False.
+        :return: dict, Mapping of member ID to the member's response.
+        """
+        def request(client):
+            # clients update data and headers in place, hence every member gets its own copies
+            return client.request(service, method, params=params, data=dict(data or {}),
+                                  headers=dict(headers or {}), get_field=get_field)
+
+        return self.map(request, return_exceptions=return_exceptions)
+
+    def report(self, report, format_='json', return_exceptions=False):
+        """
+        Run the same report for every member.
+
+        :param report: AppnexusReport, Report to be run.
+        :param format_: optional, Specify 'pandas' to get reports as DataFrames.
+        :param return_exceptions: bool (optional), Return exceptions raised for a member as its result
+            instead of raising the first of them. Defaults to False.
+        :return: dict, Mapping of member ID to the member's report.
+        """
+        return self.map(lambda client: report.get(format_=format_, client=client),
+                        return_exceptions=return_exceptions)
+
+    def map(self, func, return_exceptions=False):
+        """
+        Call `func` with every member's client concurrently.
+
+        :param func: callable, Function taking an AppnexusClient.
+        :param return_exceptions: bool (optional), Return exceptions raised for a member as its result
+            instead of raising the first of them. Defaults to False.
+        :return: dict, Mapping of member ID to the return value of `func`.
+        """
+        def call(member):
+            try:
+                return member, func(self.clients[member]), None
+            except Exception as e:
+                self._logger.warning('Request for member "{}" failed: "{}".'.format(member, e))
+                return member, None, e
+
+        thread_pool = ThreadPool(min(self.max_workers, len(self.clients)))
+        try:
+            outcomes = thread_pool.map(call, list(self.clients))
+        finally:
+            thread_pool.close()
+            thread_pool.join()
+
+        errors = [e for _, _, e in outcomes if e is not None]
+        if errors and not return_exceptions:
+            raise errors[0]
+
+        return {member: e if e is not None else result for member, result, e in outcomes}
+
+    def close(self):
+        for client in self.clients.values():
+            client.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    @staticmethod
+    def _build_client(client, scheduler_kwargs, client_kwargs):
+        if isinstance(client, AppnexusClient):
+            return client
+
+        kwargs = dict(client_kwargs)
+        if isinstance(client, dict):
+            kwargs.update(client)
+        else:
+            kwargs['path'] = client
+
+        if scheduler_kwargs is not None and 'scheduler' not in kwargs:
+            kwargs['scheduler'] = AppnexusScheduler(**scheduler_kwargs)
+
+        return AppnexusClient(**kwargs)
@@ -9,6 +9,9 @@ from datetime import datetime
 import time
 
 from nexusadspy import AppnexusClient
+from nexusadspy.checkpoint import AppnexusCheckpoint
+from nexusadspy.metadata import AppnexusReportMetadata
+from nexusadspy.rows import AppnexusRows
 from nexusadspy.exceptions import NexusadspyAPIError
 
 
@@ -17,7 +20,8 @@ class AppnexusReport():
                  groups=None, start_date=None, end_date=None, report_interval=None,
                  advertiser_ids=None, publisher_ids=None,
                  credentials_path='.appnexus_auth.json',
-                 max_retries=100, retry_seconds=2.):
+                 max_retries=100, retry_seconds=2., checkpoint_path=None, checkpoint_ttl_seconds=3600,
+                 metadata_path=None, metadata_ttl_seconds=86400):
         """
         AppNexus reporting class.
 
@@ -34,6 +38,14 @@ class AppnexusReport():
         :param credentials_path: str
         :param max_retries: int
         :param retry_seconds: float
+        :param checkpoint_path: str (optional), Path to a checkpoint journal. If given, the IDs of submitted
+            and ready reports are journaled so that a failed `get` resumes without resubmitting the report.
+            Only reports with `start_date` and `end_date` are journaled, as relative intervals change over time.
+        :param checkpoint_ttl_seconds: int (optional), Seconds after which a journaled report is submitted again
+            instead of being resumed. Defaults to one hour.
+        :param metadata_path: str (optional), Path to a report metadata cache. If given, columns, filters, and groups
+            are validated against the cached metadata of `report_type` before the report is submitted.
+        :param metadata_ttl_seconds: int (optional), Seconds after which cached report metadata is fetched again.
         :return:
         """
 
@@ -54,27 +66,55 @@ class AppnexusReport():
         self.credentials_path = credentials_path
         self.max_retries = max_retries
         self.retry_seconds = retry_seconds
+        self.checkpoint = AppnexusCheckpoint(checkpoint_path) if checkpoint_path else None
+        self.checkpoint_ttl_seconds = checkpoint_ttl_seconds
+        self.metadata = AppnexusReportMetadata(metadata_path, credentials_path=credentials_path,
+                                               ttl_seconds=metadata_ttl_seconds) if metadata_path else None
 
         self.request = self._build_request()
         self.endpoint = self._build_endpoint()
 
         self._handle_network_user_request()
 
-    def get(self, format_='json'):
+    def get(self, format_='json', client=None, joins=None):
         """
         Trigger and download the report.
 
-        :param format_: optional, Specify 'pandas' to get report as a DataFrame.
+        :param format_: optional, Specify 'pandas' to get report as a DataFrame or 'rows' to get report as compact
+            AppnexusRows. Defaults to 'json', i.e. a list of dictionaries.
+        :param client: AppnexusClient (optional), Client to run the report with. Defaults to a client using
+            `credentials_path`. Pass a client with `compact_rows=True` to keep the download compact for
+            'rows' and 'pandas'.
+        :param joins: list (optional), Tuples `(column, table, fields)` to enrich the report rows with
+            the AppnexusDimensionTable `table`, see `AppnexusDimensionTable.join`.
         :return:
         """
-        client = AppnexusClient(self.credentials_path)
-        response = self._post_request(client)
-        report_id = response['report_id']
+        client = client or AppnexusClient(self.credentials_path, compact_rows=format_ in ('rows', 'pandas'))
+        report_id, execution_status = self._get_checkpointed_report(client)
 
-        report = self._get_report(client, report_id)
+        if report_id is None:
+            response = self._post_request(client)
+            report_id = response['report_id']
+            self._checkpoint_report(client, report_id, 'submitted')
+
+        try:
+            report = self._get_report(client, report_id, skip_polling=execution_status == 'ready')
+        except Exception:
+            if execution_status is not None:
+                self._clear_checkpoint(client)  # resumed report may have expired, submit a new one next time
+            raise
+
+        self._clear_checkpoint(client)
+
+        for column, table, fields in joins or []:
+            report = table.join(report, column, fields)
 
         if format_ == 'pandas':
             report = self._convert_to_dataframe(report)
+        elif format_ == 'rows' and not isinstance(report, AppnexusRows):
+            report = AppnexusRows.from_dicts(report)
+        elif format_ not in ('pandas', 'rows') and isinstance(report, AppnexusRows):
+            report = report.to_dicts()
 
         return report
 
@@ -83,8 +123,10 @@ class AppnexusReport():
 
         return response[0]
 
-    def _get_report(self, client, report_id):
-        self._poll_and_wait(client, report_id)  # block until report ready
+    def _get_report(self, client, report_id, skip_polling=False):
+        if not skip_polling:
+            self._poll_and_wait(client, report_id)  # block until report ready
+            self._checkpoint_report(client, report_id, 'ready')
         report = self._download_report(client, report_id)
 
         return report
@@ -106,6 +148,35 @@ class AppnexusReport():
                                      'Last response was "{}".'.format(report_id,
                                                                       response))
 
+    def _get_checkpoint_key(self, client):
+        return self.checkpoint.make_key(client.path, self.endpoint, self.request)
+
+    def _is_checkpointed(self):
+        return self.checkpoint is not None and bool(self.start_date and self.end_date)
+
+    def _get_checkpointed_report(self, client):
+        if not self._is_checkpointed():
+            return None, None
+
+        entries = self.checkpoint.entries(self._get_checkpoint_key(client))
+        if not entries:
+            return None, None
+
+        if time.time() - entries[-1].get('recorded_at', 0) > self.checkpoint_ttl_seconds:
+            self._clear_checkpoint(client)
+            return None, None
+
+        return entries[-1]['report_id'], entries[-1]['execution_status']
+
+    def _checkpoint_report(self, client, report_id, execution_status):
+        if self._is_checkpointed():
+            self.checkpoint.record(self._get_checkpoint_key(client), report_id=report_id,
+                                   execution_status=execution_status, recorded_at=time.time())
+
+    def _clear_checkpoint(self, client):
+        if self._is_checkpointed():
+            self.checkpoint.clear(self._get_checkpoint_key(client))
+
     @staticmethod
     def _get_report_execution_status(response, report_id):
         try:
@@ -122,6 +193,9 @@ class AppnexusReport():
 
     @staticmethod
     def _convert_to_dataframe(report):
+        if isinstance(report, AppnexusRows):
+            return report.to_dataframe()
+
         import pandas as pd
 
         return pd.DataFrame(report)
@@ -150,6 +224,10 @@ class AppnexusReport():
         return date_string
 
     def _build_request(self):
+        if self.metadata is not None:
+            self.metadata.validate(self.report_type, self.columns, filters=self.filters, groups=self.groups,
+                                   report_interval=self.report_interval)
+
         r = self._get_request_skeleton()
         r = self._add_request_date(r)
         r = self._add_request_filters(r)
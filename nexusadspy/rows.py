@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import (
+    print_function, division, generators,
+    absolute_import, unicode_literals
+)
+
+try:
+    from collections.abc import Mapping, Sequence
+except ImportError:
+    from collections import Mapping, Sequence
+
+
+class AppnexusRow(Mapping):
+    __slots__ = ('_header', '_positions', '_values')
+
+    def __init__(self, header, positions, values):
+        """
+        Read-only, dictionary-like view of one row of AppnexusRows.
+
+        :param header: tuple, Column names shared by all rows.
+        :param positions: dict, Mapping of column name to position in `values`, shared by all rows.
+        :param values: tuple, Values of the row.
+        """
+        self._header = header
+        self._positions = positions
+        self._values = values
+
+    def __getitem__(self, column):
+        return self._values[self._positions[column]]
+
+    def __iter__(self):
+        return iter(self._header)
+
+    def __len__(self):
+        return len(self._header)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
+class AppnexusRows(Sequence):
+
+    def __init__(self, header, rows=None):
+        """
+        Compact container of result rows: the column names are stored once and every row as a tuple.
+
+        Rows are returned as dictionary-like AppnexusRow views, so callers can keep indexing rows by column name.
+
+        :param header: list, Column names.
+        :param rows: list (optional), List of value tuples in the order of `header`.
+        """
+        self.header = tuple(header)
+        self._positions = {column: i for i, column in enumerate(self.header)}
+        self._rows = [row if isinstance(row, tuple) else tuple(row) for row in rows or []]
+
+    @classmethod
+    def from_dicts(cls, dicts):
+        """
+        Build AppnexusRows from a list of dictionaries. Columns missing from a dictionary are set to None.
+
+        :param dicts: list, List of dictionaries.
+        :return: AppnexusRows
+        """
+        rows = cls([])
+        rows.extend(dicts)
+        return rows
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return AppnexusRows(self.header, self._rows[i])
+
+        return AppnexusRow(self.header, self._positions, self._rows[i])
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __iter__(self):
+        for values in self._rows:
+            yield AppnexusRow(self.header, self._positions, values)
+
+    def __eq__(self, other):
+        if not isinstance(other, (list, tuple, AppnexusRows)):
+            return NotImplemented
+
+        return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+
+    def __ne__(self, other):
+        eq = self.__eq__(other)
+        return eq if eq is NotImplemented else not eq
+
+    def __repr__(self):
+        return 'AppnexusRows(header={}, rows={})'.format(list(self.header), len(self))
+
+    def append(self, row):
+        """
+        Append one row given either as a mapping or as a sequence of values in the order of `header`.
+
+        :param row: Mapping or sequence.
+        """
+        self.extend([row])
+
+    def extend(self, rows):
+        """
+        Append rows given as AppnexusRows, mappings, or sequences of values in the order of `header`.
+        New columns found in mappings are added, existing rows get None for them.
+
+        :param rows: iterable
+        """
+        if isinstance(rows, AppnexusRows) and rows.header == self.header:
+            self._rows += rows._rows
+            return
+
+        for row in rows:
+            if isinstance(row, Mapping):
+                for column in row:
+                    if column not in self._positions:
+                        self.add_column(column, [None] * len(self))
+                self._rows.append(tuple(row.get(column) for column in self.header))
+            else:
+                self._rows.append(tuple(row))
+
+    def add_column(self, column, values):
+        """
+        Add a column to all rows or replace an existing one.
+
+        :param column: str, Column name.
+        :param values: list, One value per row.
+        """
+        if len(values) != len(self):
+            raise ValueError('Expected {} values for column "{}", got {}.'.format(len(self), column, len(values)))
+
+        if column in self._positions:
+            i = self._positions[column]
+            self._rows = [row[:i] + (value,) + row[i + 1:] for row, value in zip(self._rows, values)]
+        else:
+            self.header += (column,)
+            self._positions = dict(self._positions)
+            self._positions[column] = len(self.header) - 1
+            self._rows = [row + (value,) for row, value in zip(self._rows, values)]
+
+    def column(self, column):
+        """
+        Return all values of `column`.
+
+        :param column: str, Column name.
+        :return: list
+        """
+        i = self._positions[column]
+        return [row[i] for row in self._rows]
+
+    def to_dicts(self):
+        """
+        Convert to a list of plain dictionaries.
+
+        :return: list
+        """
+        return [dict(zip(self.header, row)) for row in self._rows]
+
+    def to_dataframe(self):
+        """
+        Convert to a pandas DataFrame straight from the row tuples, without intermediate dictionaries.
+
+        :return: pandas.DataFrame
+        """
+        import pandas as pd
+
+        return pd.DataFrame.from_records(self._rows, columns=list(self.header))
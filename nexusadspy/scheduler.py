@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import (
+    print_function, division, generators,
+    absolute_import, unicode_literals
+)
+
+from contextlib import contextmanager
+from itertools import count
+import threading
+import time
+
+
+class AppnexusScheduler:
+
+    def __init__(self, max_requests=100, period_sec=60., priorities=('interactive', 'batch'),
+                 reserved=None, max_concurrency=None):
+        """
+        Shares one AppNexus rate budget between clients sending requests of different priorities.
+
+        The budget is a token bucket holding up to `max_requests` tokens that refills over `period_sec`.
+        Waiting requests are served by priority, then in order of arrival.
+        Part of the budget can be reserved so that lower priorities can never exhaust it.
+
+        :param max_requests: int (optional), Number of requests allowed per `period_sec`. Defaults to 100.
+        :param period_sec: float (optional), Length of the rate limit period in seconds. Defaults to 60.
+        :param priorities: tuple (optional), Priority names, highest priority first.
+            Defaults to ('interactive', 'batch').
+        :param reserved: dict (optional), Number of tokens reserved for a priority and all priorities above it.
+            Defaults to a tenth of `max_requests` reserved for the highest priority.
+        :param max_concurrency: dict (optional), Maximum number of concurrent requests per priority.
+            Priorities not listed are not capped.
+        """
+        if reserved is None:
+            reserved = {priorities[0]: max(1, max_requests // 10)}
+
+        unknown = [p for p in list(reserved) + list(max_concurrency or {}) if p not in priorities]
+        if unknown:
+            raise ValueError('Unknown priorities "{}". Priorities must be one of "{}".'.format(unknown, priorities))
+
+        if sum(reserved.values()) >= max_requests:
+            raise ValueError('Reserved tokens must leave part of the budget to the lowest priority. '
+                             'You reserved "{}" of "{}".'.format(sum(reserved.values()), max_requests))
+
+        self.max_requests = max_requests
+        self.period_sec = period_sec
+        self.priorities = tuple(priorities)
+        self.reserved = reserved
+        self.max_concurrency = max_concurrency or {}
+
+        self._rate = max_requests / period_sec
+        self._tokens = float(max_requests)
+        self._last_refill = time.time()
+        self._condition = threading.Condition()
+        self._counter = count()
+        self._waiting = []
+        self._active = {p: 0 for p in self.priorities}
+        self._acquired = {p: 0 for p in self.priorities}
+        self._completed = {p: 0 for p in self.priorities}
+        self._wait_sec = {p: 0. for p in self.priorities}
+        self._max_wait_sec = {p: 0. for p in self.priorities}
+
+    @property
+    def default_priority(self):
+        return self.priorities[-1]
+
+    @contextmanager
+    def slot(self, priority=None):
+        """
+        Context manager that blocks until a request of `priority` may be sent.
+
+        :param priority: str (optional), One of `priorities`. Defaults to the lowest priority.
+        """
+        priority = self.acquire(priority)
+        try:
+            yield
+        finally:
+            self.release(priority)
+
+    def acquire(self, priority=None):
+        """
+        Block until a request of `priority` may be sent and take one token of the rate budget.
+
+        :param priority: str (optional), One of `priorities`. Defaults to the lowest priority.
+        :return: str, The priority the slot was acquired for. Pass it to `release`.
+        """
+        priority = priority or self.default_priority
+        if priority not in self.priorities:
+            raise ValueError('Argument "priority" must be one of "{}". '
+                             'You supplied: "{}".'.format(self.priorities, priority))
+
+        entry = (self.priorities.index(priority), next(self._counter))
+        start = time.time()
+
+        with self._condition:
+            self._waiting.append(entry)
+            while True:
+                self._refill()
+                deficit = self._get_token_deficit(entry[0])
+                if deficit <= 0 and self._may_proceed(entry):
+                    break
+                self._condition.wait(min(deficit / self._rate, 1.) if deficit > 0 else 1.)
+
+            self._waiting.remove(entry)
+            self._tokens -= 1
+            self._active[priority] += 1
+            self._record_wait(priority, time.time() - start)
+            self._condition.notify_all()
+
+        return priority
+
+    def release(self, priority):
+        """
+        Mark a request of `priority` acquired through `acquire` as done.
+
+        :param priority: str, The priority returned by `acquire`.
+        """
+        with self._condition:
+            self._active[priority] -= 1
+            self._completed[priority] += 1
+            self._condition.notify_all()
+
+    def penalize(self):
+        """
+        Drain the rate budget, e.g. after the API reported that the rate limit was exceeded.
+        """
+        with self._condition:
+            self._refill()
+            self._tokens = min(self._tokens, 0.)
+
+    def stats(self):
+        """
+        Queue depth and wait time statistics per priority.
+
+        :return: dict, Dictionary keyed by priority with fields `queued`, `active`, `acquired`, `completed`,
+            `mean_wait_sec`, and `max_wait_sec`. Requests count as acquired once they leave the queue
+            and as completed once they are released.
+        """
+        with self._condition:
+            return {
+                p: {
+                    'queued': sum(1 for rank, _ in self._waiting if self.priorities[rank] == p),
+                    'active': self._active[p],
+                    'acquired': self._acquired[p],
+                    'completed': self._completed[p],
+                    'mean_wait_sec': self._wait_sec[p] / self._acquired[p] if self._acquired[p] else 0.,
+                    'max_wait_sec': self._max_wait_sec[p]
+                } for p in self.priorities
+            }
+
+    def _refill(self):
+        now = time.time()
+        self._tokens = min(self.max_requests, self._tokens + (now - self._last_refill) * self._rate)
+        self._last_refill = now
+
+    def _get_token_deficit(self, rank):
+        reserved_above = sum(self.reserved.get(p, 0) for p in self.priorities[:rank])
+        return reserved_above + 1 - self._tokens
+
+    def _is_below_concurrency(self, rank):
+        priority = self.priorities[rank]
+        max_concurrency = self.max_concurrency.get(priority)
+        return max_concurrency is None or self._active[priority] < max_concurrency
+
+    def _may_proceed(self, entry):
+        if not self._is_below_concurrency(entry[0]):
+            return False
+
+        # requests ahead in the queue go first unless they are held back by their concurrency cap
+        return not any(other < entry and self._is_below_concurrency(other[0]) for other in self._waiting)
+
+    def _record_wait(self, priority, wait_sec):
+        self._acquired[priority] += 1
+        self._wait_sec[priority] += wait_sec
+        self._max_wait_sec[priority] = max(self._max_wait_sec[priority], wait_sec)
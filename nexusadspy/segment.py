@@ -4,25 +4,36 @@ from __future__ import (
     absolute_import, unicode_literals
 )
 
+from collections import OrderedDict
 from gzip import GzipFile
 from io import BytesIO
 from itertools import groupby
 import time
 import logging
 
+try:
+    string_types = basestring
+except NameError:
+    string_types = str
+
 from nexusadspy.client import AppnexusClient
+from nexusadspy.exceptions import NexusadspyAPIError
+
+NEVER_EXPIRES = 0
+REMOVE_FROM_SEGMENT = -1
 
 
 class AppnexusSegmentsUploader:
 
     def __init__(self, batch_file, upload_string_order, separators, member_id,
-                 credentials_path='.appnexus_auth.json'):
+                 credentials_path='.appnexus_auth.json', compaction=None, sorted_input=False):
         """
         Batch-upload API wrapper for AppNexus.
         :param batch_file: list, List of dictionaries representing AppNexus users. Every member should have fields
             - uid: AppNexus user ID. AAID/IDFS in case of mobile. Always first in upload string.
             - timestamp: POSIX timestamp when user entered the segment.
-            - expiration (optional): Expiration timestamp for the user. A POSIX timestamp. Defaults to 0.
+            - expiration (optional): Expiration timestamp for the user. A POSIX timestamp, 0 for a membership
+              that never expires, or -1 to remove the user from the segment. Defaults to 0.
             - value (optional): Numerical value for the segment. Defaults to 0.
             - mobile_os (optional): OS used by the user. Considered internally by AppNexus to be desktop if absent.
         :param upload_string_order: list, List specifying the order of inputs behind uid for the upload string.
@@ -31,6 +42,13 @@ class AppnexusSegmentsUploader:
         https://wiki.appnexus.com/display/api/Batch+Segment+Service+-+File+Format
         :param member_id: str, Member ID for AppNexus account.
         :param credentials_path: str (optional), Credentials path for AppnexusClient. Defaults to '.appnexus_auth.json'.
+        :param compaction: str or callable (optional), Rule to keep one row per uid and segment. One of
+            'max_timestamp' (keep the latest row), 'latest_expiration' (keep the row expiring last, or the latest
+            row if one of them removes the user), 'sum_value'
+            (keep the latest row with the values of all rows summed up), or a function taking the kept row and
+            a duplicate and returning the row to keep. Defaults to None, i.e. every row is uploaded.
+        :param sorted_input: bool (optional), Whether `batch_file` is already sorted by uid. Sorted input is
+            consumed as a stream, hence `batch_file` may be any iterable, e.g. a generator. Defaults to False.
         :return:
         """
         self._credentials_path = credentials_path
@@ -38,27 +56,40 @@ class AppnexusSegmentsUploader:
         self._upload_string_order = upload_string_order
         self._separators = separators
         self._member_id = member_id
+        if compaction is not None and not callable(compaction) and compaction not in COMPACTION_RULES:
+            raise ValueError('Argument "compaction" must be a callable or one of {}. '
+                             'You supplied: "{}".'.format(sorted(COMPACTION_RULES), compaction))
+        self._compaction = COMPACTION_RULES.get(compaction, compaction)
+        self._sorted_input = sorted_input
+        self.dropped_row_count = 0
         self._logger = logging.getLogger('nexusadspy.segment')
 
-    def upload(self, polling_duration_sec=2, max_retries=10):
+    def upload(self, polling_duration_sec=2, max_retries=10, wait=True, callback=None, max_polling_duration_sec=60):
         """
         Initiate segment upload task
-        :param polling_duration_sec: int (optional), Time to sleep while polling for status. Defaults to 2.
-        :param max_retries: int (optional), Max number of polling retries to be done. Defaults to 10.
+        :param polling_duration_sec: int (optional), Shortest time to sleep while polling for status. Defaults to 2.
+        :param max_retries: int (optional), Max number of polling retries to be done if `wait`. Defaults to 10.
+        :param wait: bool (optional), Block until the job is completed. If False, return an
+            AppnexusSegmentsUploadJob right after the file was sent. Defaults to True.
+        :param callback: callable (optional), Called with the AppnexusSegmentsUploadJob after every status poll.
+        :param max_polling_duration_sec: int (optional), Longest time to sleep while polling for status.
+            Defaults to 60.
         :return: tuple, Tuple with two values, number of valid users and invalid users.
+            If the job did not complete within `max_retries` polls, both values are 0.
+            AppnexusSegmentsUploadJob if not `wait`.
         """
-        valid_user_count = invalid_user_count = 0
         api_client = AppnexusClient(self._credentials_path)
         job_id, upload_url = self._initialize_job(api_client)
         self._upload_batch_to_url(api_client, upload_url)
-        for attempt in range(max_retries):
-            time.sleep(polling_duration_sec)
-            job_status = self._get_job_status_response(api_client, job_id)
-            if job_status[0].get('phase') == 'completed':
-                valid_user_count = job_status[0].get('num_valid_user')
-                invalid_user_count = job_status[0].get('num_invalid_user')
-                break
-        return valid_user_count, invalid_user_count
+        job = AppnexusSegmentsUploadJob(self, api_client, job_id, min_interval_sec=polling_duration_sec,
+                                        max_interval_sec=max_polling_duration_sec, callback=callback)
+        if not wait:
+            return job
+        if job.wait(max_polls=max_retries):
+            return job.result()
+        self._logger.warning('Batch segment job "{}" not completed after {} polls, last phase was "{}".'.format(
+            job_id, max_retries, job.phase))
+        return 0, 0
 
     def _initialize_job(self, api_client):
         service_endpoint = 'batch-segment?member_id={}'.format(self._member_id)
@@ -78,21 +109,37 @@ class AppnexusSegmentsUploader:
         return api_client.request(status_endpoint, 'GET', headers=headers)
 
     def _get_buffer_for_upload(self):
-        upload_string = '\n'.join(
-            self._get_upload_string(uid, batch) for uid, batch in self._get_segment_batches(self._batch_file))
-        self._logger.debug("Attempting to upload \n" + upload_string)
+        self.dropped_row_count = 0
         compressed_buffer = BytesIO()
         with GzipFile(fileobj=compressed_buffer, mode='wb') as compressor:
-            compressor.write(upload_string.encode('UTF-8'))
+            for i, (uid, batch) in enumerate(self._get_segment_batches(self._batch_file, self._sorted_input)):
+                if self._compaction is not None:
+                    batch = self._compact_batch(batch)
+                upload_string = self._get_upload_string(uid, batch)
+                self._logger.debug("Attempting to upload \n" + upload_string)
+                compressor.write((('\n' if i > 0 else '') + upload_string).encode('UTF-8'))
+        if self._compaction is not None:
+            self._logger.info('Compaction dropped {} duplicate rows.'.format(self.dropped_row_count))
         compressed_buffer.seek(0)
         return compressed_buffer
 
     @staticmethod
-    def _get_segment_batches(batch_file):
-        sorted_batch_file = sorted(batch_file, key=lambda row: row['uid'])
-        for uid, batch in groupby(sorted_batch_file, key=lambda row: row['uid']):
+    def _get_segment_batches(batch_file, sorted_input=False):
+        if not sorted_input:
+            batch_file = sorted(batch_file, key=lambda row: row['uid'])
+        for uid, batch in groupby(batch_file, key=lambda row: row['uid']):
             yield uid, batch
 
+    def _compact_batch(self, batch):
+        kept = OrderedDict()
+        row_count = 0
+        for line in batch:
+            row_count += 1
+            key = (line.get('seg_id'), line.get('seg_code'))
+            kept[key] = self._compaction(kept[key], line) if key in kept else line
+        self.dropped_row_count += row_count - len(kept)
+        return list(kept.values())
+
     def _get_upload_string(self, uid, batch):
         upload_string = str(uid) + self._separators[0]
         for line in batch:
@@ -133,3 +180,191 @@ class AppnexusSegmentsUploader:
             return '8'
         elif device_id_type == 'windowsadid':
             return '9'
+
+
+class AppnexusSegmentsUploadJob:
+
+    # relative polling intervals of job phases without progress information
+    PHASE_INTERVAL_FACTORS = {'starting': 1, 'uploading': 1, 'validating': 2, 'processing': 4}
+
+    def __init__(self, uploader, api_client, job_id, min_interval_sec=2, max_interval_sec=60, backoff=1.5,
+                 callback=None):
+        """
+        Handle of a batch segment upload job that polls the job status with adaptive intervals.
+
+        Jobs reporting their progress are polled about twice before their estimated completion.
+        Otherwise the interval depends on the job phase and grows by `backoff` with every poll in the same phase.
+
+        :param uploader: AppnexusSegmentsUploader, Uploader that started the job.
+        :param api_client: AppnexusClient, Client used for polling.
+        :param job_id: str, AppNexus batch segment job ID.
+        :param min_interval_sec: float (optional), Shortest polling interval. Defaults to 2.
+        :param max_interval_sec: float (optional), Longest polling interval. Defaults to 60.
+        :param backoff: float (optional), Growth of the polling interval while a job makes no visible progress.
+        :param callback: callable (optional), Called with the job after every status poll.
+        """
+        self.job_id = job_id
+        self.status = {}
+        self.min_interval_sec = min_interval_sec
+        self.max_interval_sec = max_interval_sec
+        self.backoff = backoff
+        self._uploader = uploader
+        self._api_client = api_client
+        self._callbacks = [callback] if callback is not None else []
+        self._started_at = time.time()
+        self._phase_polls = 0
+        self.next_poll_at = self._started_at + min_interval_sec
+
+    @property
+    def phase(self):
+        return self.status.get('phase')
+
+    @property
+    def percent_complete(self):
+        return self.status.get('percent_complete')
+
+    @property
+    def done(self):
+        return self.phase == 'completed' or self.failed
+
+    @property
+    def failed(self):
+        return bool(self.status.get('error_code'))
+
+    def add_callback(self, callback):
+        """
+        Register a function that is called with the job after every status poll.
+
+        :param callback: callable
+        """
+        self._callbacks.append(callback)
+
+    def poll(self):
+        """
+        Request the job status once and schedule the next poll.
+
+        :return: bool, Whether the job is done.
+        """
+        previous_phase = self.phase
+        self.status = self._uploader._get_job_status_response(self._api_client, self.job_id)[0]
+        self._phase_polls = self._phase_polls + 1 if self.phase == previous_phase else 0
+        self.next_poll_at = time.time() + self._get_interval()
+
+        for callback in self._callbacks:
+            callback(self)
+
+        return self.done
+
+    def wait(self, timeout_sec=None, max_polls=None):
+        """
+        Block until the job is done, `timeout_sec` passed, or the status was polled `max_polls` times.
+
+        :param timeout_sec: float (optional), Maximum time to wait.
+        :param max_polls: int (optional), Maximum number of status polls.
+        :return: bool, Whether the job is done.
+        """
+        deadline = time.time() + timeout_sec if timeout_sec is not None else None
+        polls = 0
+        while not self.done and (max_polls is None or polls < max_polls):
+            if deadline is not None and self.next_poll_at > deadline:
+                break
+            time.sleep(max(self.next_poll_at - time.time(), 0))
+            self.poll()
+            polls += 1
+
+        return self.done
+
+    def result(self):
+        """
+        Return the result of the completed job.
+
+        :return: tuple, Tuple with two values, number of valid users and invalid users.
+        """
+        if self.failed:
+            raise NexusadspyAPIError('Batch segment job "{}" failed.'.format(self.job_id),
+                                     self.status.get('error_code'), self.status.get('error_log_lines'))
+        if not self.done:
+            raise NexusadspyAPIError('Batch segment job "{}" not completed, phase is "{}".'.format(
+                self.job_id, self.phase))
+
+        return self.status.get('num_valid_user'), self.status.get('num_invalid_user')
+
+    def _get_interval(self):
+        try:
+            percent_complete = float(self.percent_complete)
+        except (TypeError, ValueError):
+            percent_complete = 0
+
+        if 0 < percent_complete < 100:
+            elapsed = time.time() - self._started_at
+            interval = elapsed * (100 - percent_complete) / percent_complete / 2
+        else:
+            interval = (self.min_interval_sec * self.PHASE_INTERVAL_FACTORS.get(self.phase, 1) *
+                        self.backoff ** self._phase_polls)
+
+        return min(max(interval, self.min_interval_sec), self.max_interval_sec)
+
+
+def wait_all(jobs, timeout_sec=None):
+    """
+    Poll many upload jobs until all of them are done, always polling the job due next.
+
+    :param jobs: list, List of AppnexusSegmentsUploadJob.
+    :param timeout_sec: float (optional), Maximum time to wait.
+    :return: bool, Whether all jobs are done.
+    """
+    deadline = time.time() + timeout_sec if timeout_sec is not None else None
+    pending = [job for job in jobs if not job.done]
+    while pending:
+        job = min(pending, key=lambda j: j.next_poll_at)
+        if deadline is not None and job.next_poll_at > deadline:
+            return False
+        time.sleep(max(job.next_poll_at - time.time(), 0))
+        if job.poll():
+            pending.remove(job)
+
+    return True
+
+
+def _to_number(value):
+    if not isinstance(value, string_types):
+        return value  # keep ints and floats as they are
+    try:
+        return int(value)
+    except ValueError:
+        return float(value)
+
+
+def _get_number(line, field):
+    return _to_number(line.get(field) or 0)
+
+
+def _keep_max_timestamp(kept, line):
+    return line if _get_number(line, 'timestamp') >= _get_number(kept, 'timestamp') else kept
+
+
+def _get_expiration(line):
+    expiration = _get_number(line, 'expiration')
+    return float('inf') if expiration == NEVER_EXPIRES else expiration
+
+
+def _keep_latest_expiration(kept, line):
+    if REMOVE_FROM_SEGMENT in (_get_number(kept, 'expiration'), _get_number(line, 'expiration')):
+        return _keep_max_timestamp(kept, line)  # the later of a removal and a membership wins
+
+    line_key = (_get_expiration(line), _get_number(line, 'timestamp'))
+    kept_key = (_get_expiration(kept), _get_number(kept, 'timestamp'))
+    return line if line_key >= kept_key else kept
+
+
+def _sum_value(kept, line):
+    merged = dict(_keep_max_timestamp(kept, line))
+    merged['value'] = _get_number(kept, 'value') + _get_number(line, 'value')
+    return merged
+
+
+COMPACTION_RULES = {
+    'max_timestamp': _keep_max_timestamp,
+    'latest_expiration': _keep_latest_expiration,
+    'sum_value': _sum_value,
+}
@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import (
+    print_function, division, generators,
+    absolute_import, unicode_literals
+)
+
+import os
+import time
+
+import pytest
+
+try:
+    from unittest.mock import patch
+except ImportError:
+    from mock import patch
+
+from nexusadspy import AppnexusClient, AppnexusReport
+from nexusadspy.checkpoint import AppnexusCheckpoint
+
+
+@pytest.fixture()
+def checkpoint_path(tmpdir):
+    return str(tmpdir.join('checkpoint.jsonl'))
+
+
+def _page(start_element, count=250):
+    items = [{'id': i} for i in range(start_element, min(start_element + 100, count))]
+    return 200, {'advertisers': items, 'count': count, 'dbg_info': {'output_term': 'advertisers'}}
+
+
+def test_checkpoint_record_and_clear(checkpoint_path):
+    checkpoint = AppnexusCheckpoint(checkpoint_path)
+    key_1 = checkpoint.make_key('advertiser', {'state': 'active'})
+    key_2 = checkpoint.make_key('advertiser', {'state': 'inactive'})
+
+    checkpoint.record(key_1, start_element=0)
+    checkpoint.record(key_2, start_element=0)
+    checkpoint.record(key_1, start_element=100)
+
+    assert [e['start_element'] for e in checkpoint.entries(key_1)] == [0, 100]
+
+    checkpoint.clear(key_1)
+    assert checkpoint.entries(key_1) == []
+    assert len(checkpoint.entries(key_2)) == 1
+
+    checkpoint.clear(key_2)
+    assert not os.path.exists(checkpoint_path)
+
+
+def test_paged_get_resumes_from_checkpoint(checkpoint_path):
+    client = AppnexusClient('foo', checkpoint_path=checkpoint_path)
+    calls = []
+
+    def failing_request(url, method, params=None, data=None, headers=None, get_field=None):
+        calls.append(data['start_element'])
+        if data['start_element'] == 200:
+            raise IOError('connection reset')
+        return _page(data['start_element'])
+
+    with patch.object(client, '_do_authenticated_request', side_effect=failing_request):
+        with pytest.raises(IOError):
+            client.request('advertiser', 'GET')
+    assert calls == [0, 100, 200]
+
+    def request(url, method, params=None, data=None, headers=None, get_field=None):
+        calls.append(data['start_element'])
+        return _page(data['start_element'])
+
+    with patch.object(client, '_do_authenticated_request', side_effect=request):
+        res = client.request('advertiser', 'GET')
+
+    assert calls == [0, 100, 200, 200]
+    assert [r['id'] for r in res] == list(range(250))
+    assert not os.path.exists(checkpoint_path)
+
+
+def test_paged_get_retry_with_same_data_resumes(checkpoint_path):
+    client = AppnexusClient('foo', checkpoint_path=checkpoint_path)
+    data = {'state': 'active'}
+    calls = []
+
+    def request(url, method, params=None, data=None, headers=None, get_field=None):
+        calls.append(data['start_element'])
+        if data['start_element'] == 200 and len(calls) == 3:
+            raise IOError('connection reset')
+        return _page(data['start_element'])
+
+    with patch.object(client, '_do_authenticated_request', side_effect=request):
+        with pytest.raises(IOError):
+            client.request('advertiser', 'GET', data=data)
+        assert data == {'state': 'active'}
+
+        res = client.request('advertiser', 'GET', data=data)
+
+    assert calls == [0, 100, 200, 200]
+    assert [r['id'] for r in res] == list(range(250))
+    assert not os.path.exists(checkpoint_path)
+
+
+def test_paged_get_discards_expired_pages(checkpoint_path):
+    client = AppnexusClient('foo', checkpoint_path=checkpoint_path, checkpoint_ttl_seconds=60)
+    calls = []
+
+    def request(url, method, params=None, data=None, headers=None, get_field=None):
+        calls.append(data['start_element'])
+        if data['start_element'] == 200 and len(calls) == 3:
+            raise IOError('connection reset')
+        return _page(data['start_element'])
+
+    with patch.object(client, '_do_authenticated_request', side_effect=request):
+        with pytest.raises(IOError):
+            client.request('advertiser', 'GET')
+
+        with patch.object(time, 'time', return_value=time.time() + 120):
+            res = client.request('advertiser', 'GET')
+
+    assert calls == [0, 100, 200, 0, 100, 200]
+    assert [r['id'] for r in res] == list(range(250))
+    assert not os.path.exists(checkpoint_path)
+
+
+def test_report_resumes_without_resubmitting(checkpoint_path):
+    report = AppnexusReport('foo', ['one'], start_date='2016-01-01', end_date='2016-01-02',
+                            checkpoint_path=checkpoint_path, retry_seconds=0.)
+
+    with patch.object(AppnexusReport, '_post_request', return_value={'report_id': 'abc'}) as mock_post:
+        with patch.object(AppnexusReport, '_poll_and_wait'):
+            with patch.object(AppnexusReport, '_download_report', side_effect=IOError('connection reset')):
+                with pytest.raises(IOError):
+                    report.get()
+        assert mock_post.call_count == 1
+
+        with patch.object(AppnexusReport, '_poll_and_wait') as mock_poll:
+            with patch.object(AppnexusReport, '_download_report', return_value=[{'one': '1'}]) as mock_download:
+                assert report.get() == [{'one': '1'}]
+
+        assert mock_post.call_count == 1
+        assert mock_poll.call_count == 0
+        assert mock_download.call_args[0][1] == 'abc'
+    assert not os.path.exists(checkpoint_path)
+
+
+def _fail_download(report):
+    with patch.object(AppnexusReport, '_post_request', return_value={'report_id': 'abc'}) as mock_post:
+        with patch.object(AppnexusReport, '_poll_and_wait'):
+            with patch.object(AppnexusReport, '_download_report', side_effect=IOError('connection reset')):
+                with pytest.raises(IOError):
+                    report.get()
+    return mock_post
+
+
+def test_report_relative_intervals_are_not_checkpointed(checkpoint_path):
+    for report_interval in ('yesterday', None):
+        report = AppnexusReport('foo', ['one'], report_interval=report_interval, checkpoint_path=checkpoint_path)
+        _fail_download(report)
+
+        assert not os.path.exists(checkpoint_path)
+
+
+def test_report_expired_checkpoint_is_resubmitted(checkpoint_path):
+    report = AppnexusReport('foo', ['one'], start_date='2016-01-01', end_date='2016-01-02',
+                            checkpoint_path=checkpoint_path, checkpoint_ttl_seconds=60)
+    _fail_download(report)
+
+    with patch.object(time, 'time', return_value=time.time() + 120):
+        assert report._get_checkpointed_report(AppnexusClient(report.credentials_path)) == (None, None)
+    assert not os.path.exists(checkpoint_path)
+
+
+def test_report_failed_resumed_download_drops_checkpoint(checkpoint_path):
+    report = AppnexusReport('foo', ['one'], start_date='2016-01-01', end_date='2016-01-02',
+                            checkpoint_path=checkpoint_path)
+    assert _fail_download(report).call_count == 1
+    assert os.path.exists(checkpoint_path)  # a fresh report stays journaled to be resumed
+
+    assert _fail_download(report).call_count == 0  # resumed, but the download fails again
+    assert not os.path.exists(checkpoint_path)
+
+    assert _fail_download(report).call_count == 1
@@ -5,17 +5,20 @@ from __future__ import (
     absolute_import, unicode_literals
 )
 
+from gzip import GzipFile
+from io import BytesIO
+import json
 import os
 
 import pytest
 
 try:
-    from unittest.mock import patch
+    from unittest.mock import MagicMock, patch
 except ImportError:
-    from mock import patch
+    from mock import MagicMock, patch
 
 from nexusadspy import AppnexusClient
-from nexusadspy.exceptions import NexusadspyConfigurationError
+from nexusadspy.exceptions import NexusadspyAPIError, NexusadspyConfigurationError
 
 
 def test_failure_no_credentials():
@@ -99,3 +102,72 @@ def test_development_mode_non_get():
 
         assert res[0]['response']['status'] == 'ok'
         assert 'development' in res[0]['response']['message']
+
+
+def _response(status_code, body):
+    response = MagicMock(status_code=status_code, headers={}, content=json.dumps(body).encode('UTF-8'))
+    response.json.return_value = body
+    response.raw = BytesIO(response.content)
+    return response
+
+
+def test_request_compression():
+    client = AppnexusClient("foo", compress_requests=True)
+    client.request_args, client.request_kwargs = (), {}
+    data = {'line-items': [{'id': i, 'state': 'active'} for i in range(100)]}
+
+    with patch.object(client.session, 'request', return_value=_response(200, {'response': {}})) as mock_request:
+        client._do_throttled_request('http://foo', 'put', data=data, headers={})
+        sent = mock_request.call_args[1]
+        assert sent['headers']['Content-Encoding'] == 'gzip'
+        with GzipFile(fileobj=BytesIO(sent['data']), mode='rb') as decompressor:
+            assert json.loads(decompressor.read().decode('UTF-8')) == data
+
+        client._do_throttled_request('http://foo', 'put', data={'id': 1}, headers={})
+        assert mock_request.call_args[1]['data'] == json.dumps({'id': 1})
+        assert 'Content-Encoding' not in mock_request.call_args[1]['headers']
+
+
+def test_iter_request_pages():
+    client = AppnexusClient("foo")
+
+    def request(url, method, params=None, data=None, headers=None, get_field=None):
+        items = [{'id': i} for i in range(data['start_element'], min(data['start_element'] + 2, 5))]
+        return 200, {'advertisers': items, 'count': 5, 'dbg_info': {'output_term': 'advertisers'}}
+
+    with patch.object(client, '_do_authenticated_request', side_effect=request) as mock_auth:
+        assert [item['id'] for item in client.iter_request('advertiser', batch_size=2)] == [0, 1, 2, 3, 4]
+        assert mock_auth.call_count == 3
+
+
+def test_iter_request_streams_pages():
+    pytest.importorskip('ijson')
+    client = AppnexusClient("foo")
+
+    def request(method, url, params=None, data=None, headers=None, stream=False):
+        start_element = json.loads(data)['start_element']
+        items = [{'id': i, 'bid': 0.5, 'segments': [{'id': i}]}
+                 for i in range(start_element, min(start_element + 2, 3))]
+        return _response(200, {'response': {'status': 'OK', 'count': 3, 'advertisers': items}})
+
+    with patch.object(client, '_get_auth_token', return_value='token'):
+        with patch.object(client.session, 'request', side_effect=request) as mock_request:
+            with patch.object(client, '_do_authenticated_request') as mock_auth:
+                items = list(client.iter_request('advertiser', get_field='advertisers', batch_size=2))
+
+    assert items == [{'id': i, 'bid': 0.5, 'segments': [{'id': i}]} for i in range(3)]
+    assert mock_request.call_count == 2
+    assert mock_request.call_args[1]['stream']
+    assert mock_auth.call_count == 0
+
+
+def test_iter_request_streaming_falls_back_on_errors():
+    pytest.importorskip('ijson')
+    client = AppnexusClient("foo")
+    error = {'response': {'error_id': 'SYNTAX', 'error': 'bad request'}}
+
+    with patch.object(client, '_get_auth_token', return_value='token'):
+        with patch.object(client.session, 'request', return_value=_response(200, error)):
+            with patch.object(client, '_do_authenticated_request', return_value=(200, error['response'])):
+                with pytest.raises(NexusadspyAPIError):
+                    list(client.iter_request('advertiser', get_field='advertisers'))
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import (
+    print_function, division, generators,
+    absolute_import, unicode_literals
+)
+
+try:
+    from unittest.mock import MagicMock, patch
+except ImportError:
+    from mock import MagicMock, patch
+
+from nexusadspy import AppnexusReport
+from nexusadspy.dimension import AppnexusDimensionTable
+
+
+def _line_items(service, method, params=None):
+    line_items = {
+        1: {'id': 1, 'name': 'first', 'advertiser': {'id': 10}, 'state': 'active'},
+        2: {'id': 2, 'name': 'second', 'advertiser': {'id': 20}, 'state': 'active'},
+        3: {'id': 3, 'name': 'third', 'advertiser': {'id': 20}, 'state': 'inactive'},
+    }
+    if 'id' in params:
+        return [line_items[int(i)] for i in params['id'].split(',') if int(i) in line_items]
+    return [line_items[1], line_items[2]]
+
+
+def test_join_uses_bulk_requests_only(tmpdir):
+    client = MagicMock()
+    client.request.side_effect = _line_items
+    table = AppnexusDimensionTable('line-item', fields=['name', 'advertiser'], client=client,
+                                   path=str(tmpdir.join('line_items.json')))
+
+    rows = [{'line_item_id': '1'}, {'line_item_id': '2'}, {'line_item_id': '3'}, {'line_item_id': '4'},
+            {'line_item_id': '1'}]
+    table.join(rows, 'line_item_id', {'line_item_name': 'name', 'advertiser_id': 'advertiser.id'})
+
+    assert [r['line_item_name'] for r in rows] == ['first', 'second', 'third', None, 'first']
+    assert [r['advertiser_id'] for r in rows] == [10, 20, 20, None, 10]
+    assert client.request.call_count == 2
+    assert client.request.call_args[1]['params'] == {'id': '3,4'}
+    assert 'state' not in table.lookup(3)
+
+    table.join([{'line_item_id': '4'}], 'line_item_id', {'line_item_name': 'name'})
+    assert client.request.call_count == 2  # unknown keys are not requested again
+
+    cached = AppnexusDimensionTable('line-item', client=client, path=str(tmpdir.join('line_items.json')))
+    assert cached.lookup('3')['name'] == 'third'
+    assert client.request.call_count == 2
+
+
+def test_expired_table_is_refreshed():
+    client = MagicMock()
+    client.request.side_effect = _line_items
+    table = AppnexusDimensionTable('line-item', client=client, ttl_seconds=0)
+
+    table.lookup(1)
+    table.lookup(1)
+    assert client.request.call_count == 2
+
+
+def test_report_joins():
+    table = AppnexusDimensionTable('line-item', client=MagicMock())
+    table.join = MagicMock(side_effect=lambda rows, on, fields: [dict(r, line_item_name='first') for r in rows])
+
+    report = AppnexusReport('foo', ['line_item_id'])
+    with patch.object(AppnexusReport, '_post_request', return_value={'report_id': 'abc'}):
+        with patch.object(AppnexusReport, '_poll_and_wait'):
+            with patch.object(AppnexusReport, '_download_report', return_value=[{'line_item_id': '1'}]):
+                res = report.get(client=MagicMock(), joins=[('line_item_id', table, {'line_item_name': 'name'})])
+
+    assert res == [{'line_item_id': '1', 'line_item_name': 'first'}]
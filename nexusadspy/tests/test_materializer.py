@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import (
+    print_function, division, generators,
+    absolute_import, unicode_literals
+)
+
+from datetime import datetime
+
+import pytest
+
+try:
+    from unittest.mock import patch
+except ImportError:
+    from mock import patch
+
+from nexusadspy import AppnexusReport
+from nexusadspy.exceptions import NexusadspyConfigurationError
+from nexusadspy.materializer import AppnexusReportMaterializer
+
+
+def _get(report, format_='json', client=None):
+    return [
+        {'hour': '2016-01-01 00:00:00', 'imps': '10'},
+        {'hour': '2016-01-01 02:00:00', 'imps': '30'},
+    ][:3 if report.start_date == '2016-01-01 00:00:00' else 0]
+
+
+def test_materialize_and_read(tmpdir):
+    materializer = AppnexusReportMaterializer(str(tmpdir), ['imps'], finalization_hours=24)
+
+    with patch.object(AppnexusReportMaterializer, '_now', return_value=datetime(2016, 1, 2, 2, 30)):
+        with patch.object(AppnexusReport, 'get', autospec=True, side_effect=_get) as mock_get:
+            assert materializer.materialize('2016-01-01 00:00:00', '2016-01-01 04:00:00') == [
+                '2016-01-01 00', '2016-01-01 01', '2016-01-01 02', '2016-01-01 03'
+            ]
+            assert mock_get.call_count == 1
+
+            # hours 00 and 01 are final by now, hours 02 and 03 are requested again
+            assert materializer.materialize('2016-01-01 00:00:00', '2016-01-01 04:00:00') == [
+                '2016-01-01 02', '2016-01-01 03'
+            ]
+            assert mock_get.call_count == 2
+            assert mock_get.call_args[0][0].start_date == '2016-01-01 02:00:00'
+            assert mock_get.call_args[0][0].end_date == '2016-01-01 04:00:00'
+
+    assert tmpdir.join('2016-01-01', '00.csv').check()
+    assert materializer.read('2016-01-01', '2016-01-01 02:00:00') == [
+        {'hour': '2016-01-01 00:00:00', 'imps': '10'}
+    ]
+
+    with pytest.raises(ValueError):
+        materializer.read('2016-01-01', '2016-01-02')
+
+
+def test_store_belongs_to_one_definition(tmpdir):
+    materializer = AppnexusReportMaterializer(str(tmpdir), ['imps'])
+
+    with patch.object(AppnexusReport, 'get', autospec=True, side_effect=_get):
+        materializer.materialize('2016-01-01 00:00:00', '2016-01-01 01:00:00')
+
+    with pytest.raises(ValueError):
+        AppnexusReportMaterializer(str(tmpdir), ['clicks']).read('2016-01-01', '2016-01-01 01:00:00')
+
+
+def test_finality_in_report_timezone(tmpdir):
+    materializer = AppnexusReportMaterializer(str(tmpdir), ['imps'], finalization_hours=24,
+                                              timezone='America/New_York')
+
+    with patch.object(AppnexusReportMaterializer, '_utcnow', return_value=datetime(2016, 1, 2, 2, 30)):
+        assert materializer._now() == datetime(2016, 1, 1, 21, 30)
+
+        # final in UTC, but not yet in New York
+        assert not materializer._is_final(datetime(2016, 1, 1, 0))
+        assert materializer._is_final(datetime(2015, 12, 31, 20))
+
+        with patch.object(AppnexusReport, 'get', autospec=True, side_effect=_get) as mock_get:
+            materializer.materialize('2016-01-01 00:00:00', '2016-01-01 01:00:00')
+            materializer.materialize('2016-01-01 00:00:00', '2016-01-01 01:00:00')
+
+    assert mock_get.call_count == 2
+    assert mock_get.call_args[0][0].timezone == 'America/New_York'
+
+
+def test_finality_requires_time_zones(tmpdir):
+    materializer = AppnexusReportMaterializer(str(tmpdir), ['imps'])
+
+    with patch('nexusadspy.materializer.ZoneInfo', None):
+        with pytest.raises(NexusadspyConfigurationError):
+            materializer._now()
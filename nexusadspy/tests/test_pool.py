@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import (
+    print_function, division, generators,
+    absolute_import, unicode_literals
+)
+
+import time
+
+import pytest
+
+try:
+    from unittest.mock import patch
+except ImportError:
+    from mock import patch
+
+from nexusadspy import AppnexusClient, AppnexusReport
+from nexusadspy.exceptions import NexusadspyAPIError
+from nexusadspy.pool import AppnexusClientPool
+
+
+def test_pool_builds_one_client_per_member():
+    client = AppnexusClient('.auth_3.json')
+    pool = AppnexusClientPool({1: '.auth_1.json', 2: {'path': '.auth_2.json', 'mode': 'development'}, 3: client},
+                              scheduler_kwargs={'max_requests': 50})
+
+    assert pool.clients[1].path == '.auth_1.json'
+    assert pool.clients[2].mode == 'development'
+    assert pool.clients[3] is client
+    assert pool.clients[1].scheduler is not pool.clients[2].scheduler
+    assert pool.clients[1].scheduler.max_requests == 50
+    assert client.scheduler is None
+
+    with pytest.raises(ValueError):
+        AppnexusClientPool({})
+
+
+def test_pool_request_runs_members_concurrently():
+    pool = AppnexusClientPool({member: '.auth_{}.json'.format(member) for member in range(5)})
+
+    def request(client, service, method, **kwargs):
+        time.sleep(0.2)
+        return [{'path': client.path, 'service': service}]
+
+    with patch.object(AppnexusClient, 'request', autospec=True, side_effect=request):
+        start = time.time()
+        res = pool.request('advertiser', 'GET')
+
+    assert time.time() - start < 0.6
+    assert res == {member: [{'path': '.auth_{}.json'.format(member), 'service': 'advertiser'}] for member in range(5)}
+
+
+def test_pool_request_errors():
+    pool = AppnexusClientPool({'good': '.auth_good.json', 'bad': '.auth_bad.json'})
+
+    def request(client, service, method, **kwargs):
+        if client.path == '.auth_bad.json':
+            raise NexusadspyAPIError('Response status code: "401"')
+        return [{}]
+
+    with patch.object(AppnexusClient, 'request', autospec=True, side_effect=request):
+        with pytest.raises(NexusadspyAPIError):
+            pool.request('advertiser', 'GET')
+
+        res = pool.request('advertiser', 'GET', return_exceptions=True)
+
+    assert res['good'] == [{}]
+    assert isinstance(res['bad'], NexusadspyAPIError)
+
+
+def test_pool_report():
+    pool = AppnexusClientPool({1: '.auth_1.json', 2: '.auth_2.json'})
+    report = AppnexusReport('foo', ['one'])
+
+    def get(report, format_='json', client=None):
+        return [{'one': client.path}]
+
+    with patch.object(AppnexusReport, 'get', autospec=True, side_effect=get):
+        res = pool.report(report)
+
+    assert res == {1: [{'one': '.auth_1.json'}], 2: [{'one': '.auth_2.json'}]}
+
+
+def test_pool_members_share_journal(tmpdir):
+    checkpoint_path = str(tmpdir.join('checkpoint.jsonl'))
+    pool = AppnexusClientPool({1: '.auth_1.json', 2: '.auth_2.json'}, checkpoint_path=checkpoint_path)
+
+    def request(client, url, method, params=None, data=None, headers=None, get_field=None):
+        if client.path == '.auth_1.json' and data['start_element'] == 100 and not request.failed:
+            request.failed = True
+            raise IOError('connection reset')
+        start_element = data['start_element']
+        items = [{'id': i, 'path': client.path} for i in range(start_element, min(start_element + 100, 150))]
+        return 200, {'advertisers': items, 'count': 150, 'dbg_info': {'output_term': 'advertisers'}}
+    request.failed = False
+
+    with patch.object(AppnexusClient, '_do_authenticated_request', autospec=True, side_effect=request):
+        res = pool.request('advertiser', 'GET', return_exceptions=True)
+        assert isinstance(res[1], IOError)
+        assert [r['path'] for r in res[2]] == ['.auth_2.json'] * 150
+
+        res = pool.request('advertiser', 'GET')
+
+    assert [r['path'] for r in res[1]] == ['.auth_1.json'] * 150
+    assert [r['id'] for r in res[1]] == list(range(150))
+    assert [r['path'] for r in res[2]] == ['.auth_2.json'] * 150
@@ -7,7 +7,12 @@ from __future__ import (
 
 import pytest
 
-from nexusadspy import AppnexusReport
+try:
+    from unittest.mock import patch
+except ImportError:
+    from mock import patch
+
+from nexusadspy import AppnexusClient, AppnexusReport
 
 
 def test_init_report():
@@ -27,3 +32,32 @@ def test_init_report():
             'timezone': 'CET'
         },
         'report_interval': 'lifetime'}
+
+
+def test_report_validation_against_cached_metadata(tmpdir):
+    metadata_path = str(tmpdir.join('metadata.json'))
+    meta = {
+        'columns': [{'column': 'hour', 'type': 'date'}, {'column': 'imps', 'type': 'int'}],
+        'filters': [{'column': 'hour', 'type': 'date'}],
+        'time_intervals': ['yesterday', 'lifetime'],
+        'time_granularity': 'hourly'
+    }
+
+    with patch.object(AppnexusClient, 'request', return_value=[meta]) as mock_request:
+        rep = AppnexusReport('network_analytics', ['hour', 'imps'], filters=[{'hour': '2016-01-01'}],
+                             report_interval='yesterday', metadata_path=metadata_path)
+        assert rep.request['report']['columns'] == ['hour', 'imps']
+        assert mock_request.call_count == 1
+
+        with pytest.raises(ValueError) as excinfo:
+            AppnexusReport('network_analytics', ['hour', 'clicks'], groups=['bogus'],
+                           metadata_path=metadata_path)
+        assert 'columns not available: "clicks"' in str(excinfo.value)
+        assert 'groups not available: "bogus"' in str(excinfo.value)
+
+        with pytest.raises(ValueError) as excinfo:
+            AppnexusReport('network_analytics', ['hour'], report_interval='last_century',
+                           metadata_path=metadata_path)
+        assert 'report_interval not available' in str(excinfo.value)
+
+        assert mock_request.call_count == 1  # metadata served from the local cache
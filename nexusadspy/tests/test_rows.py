@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import (
+    print_function, division, generators,
+    absolute_import, unicode_literals
+)
+
+import json
+
+import pytest
+
+try:
+    from unittest.mock import MagicMock, patch
+except ImportError:
+    from mock import MagicMock, patch
+
+from nexusadspy import AppnexusClient, AppnexusReport
+from nexusadspy.dimension import AppnexusDimensionTable
+from nexusadspy.rows import AppnexusRows
+
+
+def test_rows_behave_like_dictionaries():
+    rows = AppnexusRows(['hour', 'imps'], [('2016-01-01 00:00:00', '10'), ('2016-01-01 01:00:00', '20')])
+
+    assert len(rows) == 2
+    assert rows[1]['imps'] == '20'
+    assert rows[0].get('clicks') is None
+    assert list(rows[0].keys()) == ['hour', 'imps']
+    assert dict(rows[0]) == {'hour': '2016-01-01 00:00:00', 'imps': '10'}
+    assert rows == [{'hour': '2016-01-01 00:00:00', 'imps': '10'}, {'hour': '2016-01-01 01:00:00', 'imps': '20'}]
+    assert rows[1:] == [{'hour': '2016-01-01 01:00:00', 'imps': '20'}]
+    assert rows.column('imps') == ['10', '20']
+
+    with pytest.raises(KeyError):
+        rows[0]['clicks']
+
+
+def test_rows_extend_and_add_column():
+    rows = AppnexusRows.from_dicts([{'id': 1, 'name': 'first'}, {'id': 2}])
+    rows.extend([{'id': 3, 'state': 'active'}])
+    rows.extend(AppnexusRows(rows.header, [(4, 'fourth', None)]))
+
+    assert rows.header == ('id', 'name', 'state')
+    assert rows.to_dicts() == [
+        {'id': 1, 'name': 'first', 'state': None},
+        {'id': 2, 'name': None, 'state': None},
+        {'id': 3, 'name': None, 'state': 'active'},
+        {'id': 4, 'name': 'fourth', 'state': None},
+    ]
+
+    rows.add_column('name', ['a', 'b', 'c', 'd'])
+    rows.add_column('rank', [4, 3, 2, 1])
+    assert rows[0] == {'id': 1, 'name': 'a', 'state': None, 'rank': 4}
+
+    with pytest.raises(ValueError):
+        rows.add_column('rank', [1])
+
+
+def test_rows_to_dataframe():
+    pytest.importorskip('pandas')
+    rows = AppnexusRows(['hour', 'imps'], [('2016-01-01 00:00:00', '10')])
+
+    df = rows.to_dataframe()
+    assert list(df.columns) == ['hour', 'imps']
+    assert df['imps'].tolist() == ['10']
+
+
+def test_csv_reports_are_compact_on_request():
+    csv_bytestr = b'hour, imps\r\n2016-01-01 00:00:00, 10\r\n\r\n'
+
+    res = AppnexusClient._convert_csv_to_dict(csv_bytestr, 'report')
+    assert res['report'] == [{'hour': '2016-01-01 00:00:00', 'imps': '10'}]
+    assert isinstance(res['report'], list)
+
+    res = AppnexusClient._convert_csv_to_dict(csv_bytestr, 'report', compact=True)
+    assert isinstance(res['report'], AppnexusRows)
+    assert res['report'] == [{'hour': '2016-01-01 00:00:00', 'imps': '10'}]
+
+
+def test_report_formats():
+    compact = AppnexusRows(['hour', 'imps'], [('2016-01-01 00:00:00', '10')])
+    report = AppnexusReport('foo', ['hour', 'imps'])
+
+    with patch.object(AppnexusReport, '_post_request', return_value={'report_id': 'abc'}):
+        with patch.object(AppnexusReport, '_poll_and_wait'):
+            with patch.object(AppnexusReport, '_download_report', return_value=compact):
+                res = report.get(client=MagicMock())
+                assert isinstance(res, list)
+                assert json.dumps(res) == json.dumps([{'hour': '2016-01-01 00:00:00', 'imps': '10'}])
+
+                assert report.get(client=MagicMock(), format_='rows') is compact
+
+            with patch.object(AppnexusReport, '_download_report', return_value=compact.to_dicts()):
+                res = report.get(client=MagicMock(), format_='rows')
+                assert isinstance(res, AppnexusRows)
+                assert res == compact
+
+
+def test_compact_paged_get(tmpdir):
+    client = AppnexusClient('foo', compact_rows=True, checkpoint_path=str(tmpdir.join('checkpoint.jsonl')))
+
+    def request(url, method, params=None, data=None, headers=None, get_field=None):
+        if data['start_element'] == 2 and not request.failed:
+            request.failed = True
+            raise IOError('connection reset')
+        items = [{'id': i, 'name': str(i)} for i in range(data['start_element'], min(data['start_element'] + 2, 3))]
+        return 200, {'advertisers': items, 'count': 3, 'dbg_info': {'output_term': 'advertisers'}}
+    request.failed = False
+
+    with patch.object(client, '_do_authenticated_request', side_effect=request):
+        with pytest.raises(IOError):
+            client._do_paged_get('advertiser', 'get', data={}, batch_size=2)
+        r_code, res = client._do_paged_get('advertiser', 'get', data={}, batch_size=2)
+
+    assert isinstance(res, AppnexusRows)
+    assert res.column('id') == [0, 1, 2]
+
+
+def test_dimension_join_on_compact_rows():
+    client = MagicMock()
+    client.request.return_value = [{'id': 1, 'name': 'first'}]
+    table = AppnexusDimensionTable('line-item', client=client)
+
+    rows = AppnexusRows(['line_item_id', 'imps'], [('1', '10'), ('2', '20')])
+    table.join(rows, 'line_item_id', {'line_item_name': 'name'})
+
+    assert rows.column('line_item_name') == ['first', None]
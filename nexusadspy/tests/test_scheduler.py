@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import (
+    print_function, division, generators,
+    absolute_import, unicode_literals
+)
+
+import threading
+import time
+
+import pytest
+
+try:
+    from unittest.mock import MagicMock, patch
+except ImportError:
+    from mock import MagicMock, patch
+
+from nexusadspy import AppnexusClient
+from nexusadspy.scheduler import AppnexusScheduler
+
+
+def test_reserved_budget_serves_high_priority_first():
+    scheduler = AppnexusScheduler(max_requests=2, period_sec=1., reserved={'interactive': 1})
+
+    scheduler.acquire('batch')
+    waiting_batch = threading.Thread(target=scheduler.acquire, args=('batch',))
+    waiting_batch.start()
+    time.sleep(0.05)
+
+    assert scheduler.stats()['batch']['queued'] == 1
+
+    start = time.time()
+    scheduler.acquire('interactive')
+    assert time.time() - start < 0.1
+
+    waiting_batch.join()
+    stats = scheduler.stats()
+    assert stats['batch']['queued'] == 0
+    assert stats['batch']['acquired'] == 2
+    assert stats['batch']['completed'] == 0
+    assert stats['batch']['max_wait_sec'] > 0.5
+    assert stats['interactive']['acquired'] == 1
+
+    scheduler.release('batch')
+    assert scheduler.stats()['batch']['completed'] == 1
+
+
+def test_concurrency_cap():
+    scheduler = AppnexusScheduler(max_requests=10, max_concurrency={'batch': 1})
+    acquired = []
+
+    scheduler.acquire('batch')
+    waiting_batch = threading.Thread(target=lambda: acquired.append(scheduler.acquire('batch')))
+    waiting_batch.start()
+    time.sleep(0.05)
+
+    assert acquired == []
+    assert scheduler.acquire('interactive') == 'interactive'
+
+    scheduler.release('batch')
+    waiting_batch.join()
+    assert acquired == ['batch']
+    assert scheduler.stats()['batch']['active'] == 1
+
+
+def test_invalid_priorities():
+    with pytest.raises(ValueError):
+        AppnexusScheduler(reserved={'foo': 1})
+
+    with pytest.raises(ValueError):
+        AppnexusScheduler(max_requests=10, reserved={'interactive': 10})
+
+    with pytest.raises(ValueError):
+        AppnexusScheduler().acquire('foo')
+
+
+def test_client_requests_go_through_scheduler():
+    scheduler = AppnexusScheduler()
+    client = AppnexusClient('foo', scheduler=scheduler, priority='interactive')
+    client.request_args, client.request_kwargs = (), {}
+
+    response = MagicMock(status_code=200, headers={})
+    response.json.return_value = {'response': {'status': 'OK'}}
+
+    with patch.object(client.session, 'request', return_value=response):
+        client._do_throttled_request('http://foo', 'get')
+
+    assert scheduler.stats()['interactive']['acquired'] == 1
+    assert scheduler.stats()['interactive']['completed'] == 1
+    assert scheduler.stats()['interactive']['active'] == 0
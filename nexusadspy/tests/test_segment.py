@@ -1,6 +1,15 @@
 
 from gzip import GzipFile
-from nexusadspy.segment import AppnexusSegmentsUploader
+
+import pytest
+
+try:
+    from unittest.mock import MagicMock
+except ImportError:
+    from mock import MagicMock
+
+from nexusadspy.exceptions import NexusadspyAPIError
+from nexusadspy.segment import AppnexusSegmentsUploader, AppnexusSegmentsUploadJob, wait_all
 
 
 def test_segment_upload_string_creation(segment_batch):
@@ -28,3 +37,147 @@ def test_segment_upload_string_creation(segment_batch):
     expected_user_4 = '4;1278211469,777,12,20,7007:1278431469,890,21,10,7007'
 
     assert upload_string == '\n'.join([expected_user_1, expected_user_2, expected_user_3, expected_user_4])
+
+
+def _read_upload_string(uploader):
+    compressed_buffer = uploader._get_buffer_for_upload()
+    with GzipFile(fileobj=compressed_buffer, mode='rb') as compressor:
+        return compressor.read().decode('UTF-8')
+
+
+def test_segment_upload_compaction():
+    batch = [
+        {'uid': 1, 'seg_id': 123, 'timestamp': 100, 'expiration': 50, 'value': 1},
+        {'uid': 2, 'seg_id': 123, 'timestamp': 100, 'expiration': 0, 'value': 1},
+        {'uid': 1, 'seg_id': 123, 'timestamp': 300, 'expiration': 10, 'value': 2},
+        {'uid': 1, 'seg_id': 456, 'timestamp': 200, 'expiration': 0, 'value': 5},
+        {'uid': 1, 'seg_id': 123, 'timestamp': 200, 'expiration': 90, 'value': 4},
+    ]
+    order = ['seg_id', 'timestamp', 'expiration', 'value']
+    separators = [';', ':', ',', '~', '^']
+
+    uploader = AppnexusSegmentsUploader(batch, order, separators, 7007, compaction='max_timestamp')
+    assert _read_upload_string(uploader) == '1;123,300,10,2:456,200,0,5\n2;123,100,0,1'
+    assert uploader.dropped_row_count == 2
+
+    uploader = AppnexusSegmentsUploader(batch, order, separators, 7007, compaction='latest_expiration')
+    assert _read_upload_string(uploader) == '1;123,200,90,4:456,200,0,5\n2;123,100,0,1'
+
+    uploader = AppnexusSegmentsUploader(batch, order, separators, 7007, compaction='sum_value')
+    assert _read_upload_string(uploader) == '1;123,300,10,7:456,200,0,5\n2;123,100,0,1'
+
+    uploader = AppnexusSegmentsUploader(batch, order, separators, 7007)
+    assert _read_upload_string(uploader) == '1;123,100,50,1:123,300,10,2:456,200,0,5:123,200,90,4\n2;123,100,0,1'
+    assert uploader.dropped_row_count == 0
+
+    with pytest.raises(ValueError):
+        AppnexusSegmentsUploader(batch, order, separators, 7007, compaction='min_timestamp')
+
+
+def test_segment_upload_sorted_input_stream():
+    batch = (
+        {'uid': uid, 'seg_id': seg_id, 'timestamp': 100 + i}
+        for i, (uid, seg_id) in enumerate([(1, 123), (1, 123), (2, 123), (3, 456)])
+    )
+    uploader = AppnexusSegmentsUploader(batch, ['seg_id', 'timestamp'], [';', ':', ',', '~', '^'], 7007,
+                                        compaction='max_timestamp', sorted_input=True)
+
+    assert _read_upload_string(uploader) == '1;123,101\n2;123,102\n3;456,103'
+    assert uploader.dropped_row_count == 1
+
+
+def _uploader_with_job_statuses(*statuses):
+    uploader = AppnexusSegmentsUploader([], ['seg_id'], [';', ':', ',', '~', '^'], 7007)
+    uploader._initialize_job = MagicMock(return_value=('job', 'http://upload'))
+    uploader._upload_batch_to_url = MagicMock()
+    uploader._get_job_status_response = MagicMock(side_effect=[[status] for status in statuses])
+    return uploader
+
+
+def test_segment_upload_blocking():
+    uploader = _uploader_with_job_statuses({'phase': 'validating'},
+                                           {'phase': 'completed', 'num_valid_user': 3, 'num_invalid_user': 1})
+    assert uploader.upload(polling_duration_sec=0.001) == (3, 1)
+
+    uploader = _uploader_with_job_statuses({'phase': 'validating'}, {'phase': 'processing'})
+    assert uploader.upload(polling_duration_sec=0.001, max_retries=2) == (0, 0)
+
+
+def test_segment_upload_job_handle():
+    progress = []
+    uploader = _uploader_with_job_statuses({'phase': 'processing', 'percent_complete': 50},
+                                           {'phase': 'completed', 'num_valid_user': 3, 'num_invalid_user': 0})
+    job = uploader.upload(polling_duration_sec=0.001, wait=False,
+                          callback=lambda j: progress.append((j.phase, j.percent_complete)))
+
+    assert isinstance(job, AppnexusSegmentsUploadJob)
+    assert not job.done
+    with pytest.raises(NexusadspyAPIError):
+        job.result()
+
+    assert job.wait()
+    assert job.result() == (3, 0)
+    assert progress == [('processing', 50), ('completed', None)]
+
+
+def test_segment_upload_job_intervals():
+    job = AppnexusSegmentsUploadJob(None, None, 'job', min_interval_sec=1, max_interval_sec=60)
+
+    job.status = {'phase': 'processing'}
+    assert job._get_interval() == 4
+    job._phase_polls = 2
+    assert job._get_interval() == 9
+
+    job._started_at -= 30
+    job.status = {'phase': 'processing', 'percent_complete': 75}
+    assert 4.9 < job._get_interval() < 5.1
+
+    job.status = {'phase': 'processing', 'percent_complete': 1}
+    assert job._get_interval() == 60
+
+
+def test_segment_upload_wait_all():
+    failed = _uploader_with_job_statuses({'phase': 'validating', 'error_code': 'INVALID_FORMAT'})
+    completed = _uploader_with_job_statuses({'phase': 'processing'},
+                                            {'phase': 'completed', 'num_valid_user': 1, 'num_invalid_user': 0})
+    jobs = [u.upload(polling_duration_sec=0.001, wait=False) for u in (failed, completed)]
+
+    assert wait_all(jobs)
+    assert jobs[1].result() == (1, 0)
+    with pytest.raises(NexusadspyAPIError):
+        jobs[0].result()
+
+
+def test_segment_upload_compaction_keeps_floats():
+    order = ['seg_id', 'timestamp', 'value']
+    separators = [';', ':', ',', '~', '^']
+
+    batch = [{'uid': 1, 'seg_id': 1, 'timestamp': 101, 'value': 0.5},
+             {'uid': 1, 'seg_id': 1, 'timestamp': 100, 'value': '0.5'}]
+    uploader = AppnexusSegmentsUploader(batch, order, separators, 7007, compaction='sum_value')
+    assert _read_upload_string(uploader) == '1;1,101,1.0'
+
+    batch = [{'uid': 1, 'seg_id': 1, 'timestamp': 100.7, 'expiration': 5.5, 'value': 1},
+             {'uid': 1, 'seg_id': 1, 'timestamp': 100.2, 'expiration': 5.2, 'value': 2}]
+    for compaction in ('max_timestamp', 'latest_expiration'):
+        for rows in (batch, batch[::-1]):
+            uploader = AppnexusSegmentsUploader(rows, order, separators, 7007, compaction=compaction)
+            assert _read_upload_string(uploader) == '1;1,100.7,1'
+
+
+def test_segment_upload_compaction_special_expirations():
+    batch = [
+        {'uid': 1, 'seg_id': 1, 'timestamp': 100, 'expiration': 500},
+        {'uid': 1, 'seg_id': 1, 'timestamp': 50, 'expiration': 0},
+        {'uid': 2, 'seg_id': 1, 'timestamp': 100, 'expiration': 500},
+        {'uid': 2, 'seg_id': 1, 'timestamp': 200, 'expiration': -1},
+        {'uid': 3, 'seg_id': 1, 'timestamp': 100, 'expiration': -1},
+        {'uid': 3, 'seg_id': 1, 'timestamp': 200, 'expiration': 50},
+    ]
+    order = ['seg_id', 'timestamp', 'expiration']
+    separators = [';', ':', ',', '~', '^']
+
+    for rows in (batch, batch[::-1]):
+        uploader = AppnexusSegmentsUploader(rows, order, separators, 7007, compaction='latest_expiration')
+        # never expiring beats any expiration, the later of a removal and a membership wins
+        assert _read_upload_string(uploader) == '1;1,50,0\n2;1,200,-1\n3;1,200,50'